@@ -0,0 +1,273 @@
+import os
+import sys
+import sqlite3
+import threading
+import statistics
+import pandas as pd
+
+from pathlib import Path
+from geocodeGV import CACHE_DIR
+from histGV import MODULES, find_calls, pending_calls, iter_parsed_calls, INGEST_WORKERS
+
+
+AWARDS_FILE = Path(os.environ.get('INTERIGV_AWARDS_FILE', CACHE_DIR / 'awards.sqlite'))
+STATS_FIELDS = ['offered', 'awarded', 'min_winner', 'median_winner', 'max_winner']
+AWARDS_VERSION = 2  # increase if tables change, index is then built again
+
+
+def winner_stats(winners: list[int | None]) -> tuple:
+    # offered and awarded places and min/median/max position of winners, None if none was awarded
+
+    awarded = sorted(winner for winner in winners if winner is not None)
+    if not awarded:
+        return len(winners), 0, None, None, None
+
+    return len(winners), len(awarded), awarded[0], statistics.median(awarded), awarded[-1]
+
+class AwardsIndex:
+    """
+    PURPOSE:
+
+        Persistent index of winner position of every place in past results in SQLite, keyed by
+        (option, code, school_id, city_id, date), with per code, per school and per type aggregates of every
+        option that are updated for the codes of every new call. Dificil rankings and continua list positions
+        are never pooled together
+
+    MANDATORY ARGUMENTS:
+
+        None
+    """
+
+    def __init__(self, file: Path=AWARDS_FILE):
+
+        self.file = Path(file)
+        self.lock = threading.Lock()
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.file, check_same_thread=False)
+
+        # index of an older version is dropped, calls are then added again by add_calls
+        if self.db.execute('PRAGMA user_version').fetchone()[0] < AWARDS_VERSION:
+            self.db.executescript(
+                'DROP TABLE IF EXISTS awards; DROP TABLE IF EXISTS calls; DROP TABLE IF EXISTS school_stats; '
+                'DROP TABLE IF EXISTS code_stats; DROP TABLE IF EXISTS type_stats;'
+                f'PRAGMA user_version = {AWARDS_VERSION};'
+            )
+
+        self.db.executescript(
+            'CREATE TABLE IF NOT EXISTS awards ('
+            'code TEXT NOT NULL, school_id TEXT NOT NULL, city_id TEXT NOT NULL, date TEXT NOT NULL, option TEXT NOT NULL, '
+            'province TEXT, city TEXT, school_name TEXT, type TEXT, winner INTEGER, '
+            'PRIMARY KEY (option, code, school_id, city_id, date));'
+            'CREATE INDEX IF NOT EXISTS awards_call ON awards (option, date);'
+            'CREATE TABLE IF NOT EXISTS calls (key TEXT PRIMARY KEY, offert TEXT, result TEXT);'
+            'CREATE TABLE IF NOT EXISTS files (digest TEXT PRIMARY KEY, file TEXT, option TEXT, kind TEXT);'
+            'CREATE TABLE IF NOT EXISTS school_stats ('
+            'option TEXT NOT NULL, code TEXT NOT NULL, school_id TEXT NOT NULL, city_id TEXT NOT NULL, '
+            'province TEXT, city TEXT, school_name TEXT, '
+            'offered INTEGER, awarded INTEGER, min_winner INTEGER, median_winner REAL, max_winner INTEGER, last_date TEXT, '
+            'PRIMARY KEY (option, code, school_id, city_id));'
+            'CREATE INDEX IF NOT EXISTS school_stats_winner ON school_stats (option, code, max_winner);'
+            'CREATE TABLE IF NOT EXISTS code_stats ('
+            'option TEXT NOT NULL, code TEXT NOT NULL, '
+            'offered INTEGER, awarded INTEGER, min_winner INTEGER, median_winner REAL, max_winner INTEGER, '
+            'PRIMARY KEY (option, code));'
+            'CREATE TABLE IF NOT EXISTS type_stats ('
+            'option TEXT NOT NULL, code TEXT NOT NULL, type TEXT NOT NULL, offered INTEGER, awarded INTEGER, '
+            'PRIMARY KEY (option, code, type));'
+        )
+
+    def files(self) -> dict[str, dict]:
+        # option and kind by pdf digest, as needed by find_calls
+
+        with self.lock:
+            rows = self.db.execute('SELECT digest, file, option, kind FROM files').fetchall()
+        return {row[0]: dict(zip(['file', 'option', 'kind'], row[1:])) for row in rows}
+
+    def store_files(self, files: dict[str, dict]) -> None:
+
+        with self.lock, self.db:
+            self.db.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)',
+                                [(digest, entry['file'], entry['option'], entry['kind'])
+                                 for digest, entry in files.items()])
+
+    def calls(self) -> dict[str, dict]:
+        # digests of offerts and results pdfs of every call in index
+
+        with self.lock:
+            rows = self.db.execute('SELECT key, offert, result FROM calls').fetchall()
+        return {key: {'offert': offert, 'result': result} for key, offert, result in rows}
+
+    def add_call(self, key: str, digests: dict[str, str], df: pd.DataFrame) -> int:
+        """
+        PURPOSE:
+
+            Add winner position of every place of a call, places of the call already in index are replaced,
+            and refresh aggregates of codes in call
+
+        MANDATORY ARGUMENTS:
+
+            key: option/date of call
+            digests: digests of offerts and results pdfs of call
+            df: places of call as given by parse_call in histGV.py
+        """
+        option, date = key.split('/')
+        columns = ['code', 'school_id', 'city_id', 'province', 'city', 'school_name', 'type', 'winner']
+        rows = []
+        for code, school_id, city_id, province, city, school_name, type_, winner in \
+                zip(*[df[column].astype(object).where(df[column].notna(), None) for column in columns]):
+            rows.append((code, school_id, city_id, date, option, province, city, school_name, type_ or '',
+                         None if winner is None else int(winner)))
+
+        with self.lock, self.db:
+            codes = {code for (code,) in self.db.execute('SELECT DISTINCT code FROM awards WHERE option = ? AND date = ?',
+                                                         (option, date))}
+            self.db.execute('DELETE FROM awards WHERE option = ? AND date = ?', (option, date))
+            self.db.executemany('INSERT OR REPLACE INTO awards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self.db.execute('INSERT OR REPLACE INTO calls VALUES (?, ?, ?)', (key, digests['offert'], digests['result']))
+            self.refresh_stats(option, codes | {row[0] for row in rows})
+
+        return len(rows)
+
+    def refresh_stats(self, option: str, codes: set[str]) -> None:
+        # recompute aggregates of codes of option from awards, lock must be held by caller
+
+        for code in codes:
+            schools, types, winners = {}, {}, []
+            for school_id, city_id, province, city, school_name, type_, winner, date in self.db.execute(
+                    'SELECT school_id, city_id, province, city, school_name, type, winner, date FROM awards '
+                    'WHERE option = ? AND code = ? ORDER BY date', (option, code)):
+                school = schools.setdefault((school_id, city_id), {'winners': []})
+                school.update(province=province, city=city, school_name=school_name, last_date=date)
+                school['winners'].append(winner)
+                types.setdefault(type_, []).append(winner)
+                winners.append(winner)
+
+            for table in ['school_stats', 'code_stats', 'type_stats']:
+                self.db.execute(f'DELETE FROM {table} WHERE option = ? AND code = ?', (option, code))
+
+            self.db.executemany('INSERT INTO school_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                [(option, code, school_id, city_id, school['province'], school['city'], school['school_name'],
+                                  *winner_stats(school['winners']), school['last_date'])
+                                 for (school_id, city_id), school in schools.items()])
+            self.db.executemany('INSERT INTO type_stats VALUES (?, ?, ?, ?, ?)',
+                                [(option, code, type_, *winner_stats(type_winners)[:2]) for type_, type_winners in types.items()])
+            if winners:
+                self.db.execute('INSERT INTO code_stats VALUES (?, ?, ?, ?, ?, ?, ?)', (option, code, *winner_stats(winners)))
+
+    def places(self, option: str, code: str, position: int, province: str=None) -> list[dict]:
+        """
+        PURPOSE:
+
+            Get places of code whose winner had a list position greater or equal than position in any past call
+            of option, i.e. places that could have been awarded to position
+
+        MANDATORY ARGUMENTS:
+
+            option: dificil or continua
+            code: code of places
+            position: position in list
+        """
+        query = 'SELECT * FROM school_stats WHERE option = ? AND code = ? AND max_winner >= ?'
+        params = [option, code, position]
+        if province:
+            query += ' AND province = ?'
+            params.append(province.upper())
+
+        with self.lock:
+            cursor = self.db.execute(query + ' ORDER BY max_winner DESC', params)
+            fields = [column[0] for column in cursor.description]
+            return [dict(zip(fields, row)) for row in cursor.fetchall()]
+
+    def code_stats(self, option: str, code: str) -> dict | None:
+        # aggregates of code in calls of option with fill rate (awarded/offered) by type, None if code is not in index
+
+        with self.lock:
+            row = self.db.execute(f'SELECT {", ".join(STATS_FIELDS)} FROM code_stats WHERE option = ? AND code = ?',
+                                  (option, code)).fetchone()
+            types = self.db.execute('SELECT type, offered, awarded FROM type_stats WHERE option = ? AND code = ? ORDER BY type',
+                                    (option, code)).fetchall()
+        if not row:
+            return None
+
+        stats = dict(zip(STATS_FIELDS, row))
+        stats['fill_rate'] = {type_ or '-': awarded / offered for type_, offered, awarded in types}
+        return stats
+
+def add_calls(pdf_dir: Path, index: AwardsIndex, workers: int=INGEST_WORKERS) -> int:
+    """
+    PURPOSE:
+
+        Add calls in directory with results pdf not in index yet, calls are parsed in parallel by a process pool
+
+    MANDATORY ARGUMENTS:
+
+        pdf_dir: directory with pdfs
+        index: awards index
+    """
+    files = index.files()
+    calls = find_calls(pdf_dir, files)
+    index.store_files(files)
+
+    # only calls with results have winners
+    calls = {key: call for key, call in calls.items() if call['result'] is not None}
+    pending = pending_calls(calls, index.calls())
+    print(f'{len(calls) - len(pending)} calls already in index, {len(pending)} to add')
+
+    added = 0
+    for key, digests, df in iter_parsed_calls(pending, workers):
+        print(f' Added {key} ({index.add_call(key, digests, df)} places)')
+        added += 1
+
+    return added
+
+def print_places(places: list[dict]) -> None:
+
+    print(f'{"school":<40} {"city":<28} {"province":<10} {"offers":>6} {"min":>6} {"median":>7} {"max":>6} {"last":>10}')
+    for place in places:
+        school = f'{place["school_name"] or ""} ({place["school_id"]})'
+        print(f'{school[:40]:<40} {(place["city"] or "")[:28]:<28} {place["province"] or "":<10} {place["offered"]:6d} '
+              f'{place["min_winner"]:6d} {place["median_winner"]:7.1f} {place["max_winner"]:6d} {place["last_date"]:>10}')
+
+def print_help():
+
+    print('')
+    print('Usage:')
+    print('=====')
+    print('')
+    print(' python awardsGV.py add /path/to/pdfs')
+    print(' python awardsGV.py places dificil|continua code position [province]')
+    print(' python awardsGV.py stats dificil|continua code')
+    print('')
+    print(' - add: add calls with results pdf in directory not in index yet (see histGV.py for how pdfs are paired)')
+    print(' - places: places of code whose winner had a position greater or equal than position in any call of option')
+    print(' - stats: min/median/max winner position and fill rate by type of code in calls of option')
+    print('')
+    print(f' Index is kept in \'{AWARDS_FILE}\' (set INTERIGV_AWARDS_FILE to change it)')
+    print('')
+
+if __name__ == '__main__':
+
+    nargs = {'add': [3], 'places': [5, 6], 'stats': [4]}
+    if len(sys.argv) < 2 or sys.argv[1] not in nargs or len(sys.argv) not in nargs[sys.argv[1]] \
+            or (sys.argv[1] != 'add' and sys.argv[2] not in MODULES) or (sys.argv[1] == 'places' and not sys.argv[4].isdigit()):
+        print_help()
+        raise RuntimeError('Arguments are missing or incorrect')
+
+    index = AwardsIndex()
+
+    if sys.argv[1] == 'add':
+        add_calls(Path(sys.argv[2]), index)
+    elif sys.argv[1] == 'places':
+        places = index.places(sys.argv[2], sys.argv[3], int(sys.argv[4]), sys.argv[5] if len(sys.argv) == 6 else None)
+        print_places(places)
+        print(f'{len(places)} places')
+    else:
+        stats = index.code_stats(sys.argv[2], sys.argv[3])
+        if stats is None:
+            print(f'No {sys.argv[2]} results for code {sys.argv[3]} in index')
+        else:
+            print(f'Winner position for {sys.argv[3]} ({sys.argv[2]}): min {stats["min_winner"]}, median {stats["median_winner"]}, '
+                  f'max {stats["max_winner"]} ({stats["awarded"]} awarded out of {stats["offered"]} offerted)')
+            print(' Fill rate by type:')
+            for type_, rate in stats['fill_rate'].items():
+                print(f'  - {type_}: {rate:.0%}')
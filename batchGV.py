@@ -0,0 +1,155 @@
+import re
+import sys
+import json
+import pandas as pd
+
+import dificilGV
+import continuaGV
+from pathlib import Path
+from utilsGV import iter_pdf_matches, prefetch, parse_offert_records, offert_table_to_df, city_coordinates, add_distance_column, \
+    parse_result_dificil_records, parse_result_continua_records, print_continua_info, write_csv, \
+    EXTRACT_WORKERS
+
+
+MODULES = {'dificil': dificilGV, 'continua': continuaGV}
+PROFILE_KEYS = ['id', 'home', 'name', 'codes', 'provinces']
+
+
+def read_profiles(file: Path) -> list[dict[str, str | list]]:
+    """
+    PURPOSE:
+
+        Read candidate profiles from json file, a list of candidates with the same keys as CANDIDATE
+        plus an id to name their summary, e.g. [{"id": "ana", "home": "Valencia", "name": "Surname1 Surname2 Name",
+        "codes": ["206", "207"], "provinces": ["VALÈNCIA", "VALENCIA"]}]
+
+    MANDATORY ARGUMENTS:
+
+        file: json file with candidate profiles
+    """
+    with open(file, encoding='utf-8') as f:
+        profiles = json.load(f)
+
+    if not isinstance(profiles, list) or not profiles:
+        raise ValueError(f'File \'{file}\' must have a list of candidate profiles')
+
+    ids = set()
+    for profile in profiles:
+        missing = [key for key in PROFILE_KEYS if key not in profile]
+        if missing:
+            raise ValueError(f'Profile {profile.get("id", profile)} has no {", ".join(missing)}')
+
+        profile['id'] = str(profile['id'])
+        if not re.fullmatch(r'[\w.-]+', profile['id']) or profile['id'] in ids:
+            raise ValueError(f'Profile id \'{profile["id"]}\' is repeated or is not valid for a file name')
+        ids.add(profile['id'])
+
+        # provinces are case insensitive, they are compared with provinces in pdf in upper case
+        profile['codes'] = [str(code) for code in profile['codes']]
+        profile['provinces'] = [province.upper() for province in profile['provinces']]
+
+    return profiles
+
+def union_candidate(profiles: list[dict[str, str | list]]) -> dict[str, list]:
+    # codes and provinces of every profile, pdfs are parsed once for all of them
+
+    return {
+        'codes': list(dict.fromkeys(code for profile in profiles for code in profile['codes'])),
+        'provinces': list(dict.fromkeys(province for profile in profiles for province in profile['provinces'])),
+    }
+
+def candidate_mask(df: pd.DataFrame, candidate: dict[str, str | list]) -> pd.Series:
+
+    return df['code'].isin(candidate['codes']) & df['province'].isin(candidate['provinces'])
+
+def process_batch(
+    pdf_offert_file: Path,
+    pdf_result_file: Path,
+    option: str,
+    profiles: list[dict[str, str | list]],
+    workers: int=EXTRACT_WORKERS,
+) -> list[Path]:
+    """
+    PURPOSE:
+
+        Write a summary for every candidate profile, pdfs are extracted and parsed once for all profiles
+        and cities are geocoded once, then offerts are filtered and results matched for each candidate.
+        Summaries are written next to offerts pdf with profile id as suffix
+
+    MANDATORY ARGUMENTS:
+
+        pdf_offert_file: pdf file with place offerts
+        pdf_result_file: pdf file with final results, None if not available
+        option: dificil or continua
+        profiles: candidate profiles as in read_profiles
+    """
+    if not Path(pdf_offert_file).exists():
+        raise FileNotFoundError(f'File \'{pdf_offert_file}\' not found')
+
+    if pdf_result_file and not Path(pdf_result_file).exists():
+        raise FileNotFoundError(f'File \'{pdf_result_file}\' not found')
+
+    module = MODULES[option]
+    candidate = union_candidate(profiles)
+    columns = module.DEFAULT_COLUMNS + module.EXTRA_COLUMNS if pdf_result_file else module.DEFAULT_COLUMNS
+
+    offert_records = iter_pdf_matches(pdf_offert_file, module.OFFERT_CHECK_LINE, module.OFFERT_PATTERN, workers=workers,
+                                      candidate=candidate)
+    result_records = prefetch(iter_pdf_matches(pdf_result_file, module.RESULT_CHECK_LINE, module.RESULT_PATTERN,
+                                               workers=workers, candidate=candidate)) if pdf_result_file else None
+
+    print(f'Processing {pdf_offert_file} file ')
+    offerts = offert_table_to_df(parse_offert_records(offert_records, candidate), columns)
+    latitude, longitude = city_coordinates(offerts) if not offerts.empty else (None, None)
+
+    if pdf_result_file:
+        print(f'Processing {pdf_result_file} file ')
+        result_records = list(result_records)
+
+    csv_files = []
+    for profile in profiles:
+        print(f'Summary for {profile["id"]}')
+        mask = candidate_mask(offerts, profile).to_numpy()
+        df = offerts[mask].reset_index(drop=True)
+        df.index = pd.RangeIndex(1, len(df)+1)
+        df = add_distance_column(df, profile, coordinates=(latitude[mask], longitude[mask]) if len(df) else None)
+
+        if pdf_result_file and option == 'dificil':
+            df = parse_result_dificil_records(result_records, profile, df)
+        elif pdf_result_file:
+            df, stats = parse_result_continua_records(result_records, profile, df)
+            print_continua_info(stats)
+
+        csv_file = pdf_offert_file.with_name(f'{pdf_offert_file.stem}_{profile["id"]}.csv')
+        write_csv(df, csv_file)
+        print(f'See summary in \'{csv_file}\'')
+        csv_files.append(csv_file)
+
+    return csv_files
+
+def print_help():
+
+    print('')
+    print('Usage:')
+    print('=====')
+    print('')
+    print(' python batchGV.py dificil|continua /path/to/profiles.json /path/to/offerts.pdf [/path/to/results.pdf]')
+    print('')
+    print(' - dificil|continua: option of pdfs')
+    print(' - profiles.json: list of candidates, each with id, home, name, codes and provinces as in CANDIDATE')
+    print(' - offerts.pdf: pdf file with place offerts')
+    print(' - results.pdf: pdf file with final results (optional, if included more info is shown in summaries)')
+    print('')
+    print(' One summary is written for every candidate, next to offerts pdf with candidate id as suffix')
+    print('')
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in [4, 5] or sys.argv[1] not in MODULES:
+        print_help()
+        raise RuntimeError('Arguments are missing or incorrect')
+
+    pdf_offert_file = Path(sys.argv[3])
+    pdf_result_file = Path(sys.argv[4]) if len(sys.argv) == 5 else None
+
+    process_batch(pdf_offert_file, pdf_result_file, sys.argv[1], read_profiles(Path(sys.argv[2])))
@@ -0,0 +1,616 @@
+import gc
+import sys
+import json
+import time
+import random
+import hashlib
+import tempfile
+import subprocess
+import pandas as pd
+
+import utilsGV
+import dificilGV
+import continuaGV
+from pathlib import Path
+from contextlib import contextmanager
+from geocodeGV import CACHE_DIR
+from utilsGV import parse_offert_lines, offert_table_to_df, get_param_in_match, iter_matches, iter_pdf_lines, iter_pdf_matches, \
+    join_split_entries, iter_offert_records, index_sections, iter_section_lines, is_candidate_section, \
+    parse_result_dificil_records, parse_result_continua_records, parse_offert_records, add_distance_values, \
+    build_place_index, result_dificil_updates, result_continua_updates, apply_table_updates, result_stats, write_records, \
+    OFFERT_FIELDS, RESULT_COLUMN_TYPES
+from cacheGV import iter_cached_pages
+
+
+SEED = 31
+CITIES = [('ALACANT', '03010119'), ('ALCOI', '03000394'), ('ALTEA', '03002573'), ('CALP', '03013716'),
+          ('ELX', '03009661'), ('GANDIA', '46013110'), ('VALÈNCIA', '46023419'), ('CASTELLÓ DE LA PLANA', '12004000')]
+SUBJECTS = ['MATEMÁTICAS', 'FÍSICA Y QUÍMICA', 'LABORATORIO', 'ESTÉTICA', 'PROCESOS QUÍMICOS']
+TYPES = ['SUSTITUCIÓN DETERMINADA', 'SUSTITUCIÓN INDETERMINADA', 'VACANTE']
+PROVINCES = ['Alacant', 'Castelló', 'València']
+SIZES = [1000, 2500, 5000, 10000, 20000, 50000]
+MAX_APPEND_SIZE = 10000  # row by row appends are too slow above this
+LINES_SIZE = 200000
+EXAMPLES_DIR = Path(__file__).with_name('examples')
+MODULES = {'dificil': dificilGV, 'continua': continuaGV}
+SUITE_SIZES = [1000, 10000, 100000, 1000000]
+SUITE_CODES = [1, 20, 200]
+SUITE_STAGES = ['lines', 'match', 'offerts', 'results', 'write']
+SUITE_PROVINCES = ['ALACANT', 'CASTELLÓ', 'VALÈNCIA']
+SUITE_NAMES = ['SANCHEZ MALLORQUIN, MARIA', 'LLORCA COLOMER, TERESA', 'LOPEZ AMOROS, DOLORES', 'GARCIA PUIG, JOAN']
+SUITE_PAGE_LINES = 60
+SUITE_BUDGET = 0.5  # seconds, timed stages are run again until this is spent and best time is kept
+SUITE_TOLERANCE = 0.25  # throughput below baseline by more than this is a regression
+BENCH_BASELINE_FILE = CACHE_DIR / 'bench_baseline.json'
+STARTUP_MODULES = ['dificilGV', 'continuaGV', 'participantsGV', 'histGV', 'serveGV']
+HEAVY_MODULES = ['numpy', 'pandas', 'geopy', 'pdftotext']
+STARTUP_RUNS = 7
+
+
+def continua_offert_lines(rows: int, codes: list[str], seed: int=SEED) -> list[str]:
+    """
+    PURPOSE:
+
+        Generate text lines of a continua offert pdf with the given number of school rows
+
+    MANDATORY ARGUMENTS:
+
+        rows: number of school rows
+        codes: specialty codes, rows are spread evenly among codes and provinces
+    """
+    rand = random.Random(seed)
+    lines = ['Llocs Ofertats/ Puestos Ofertados']
+    per_section = max(1, rows // (len(codes) * len(PROVINCES)))
+    school_id = 800000
+
+    while school_id - 800000 < rows:
+        for code in codes:
+            lines.append(f'   ESPECIALIDAD/ESPECIALITAT:   {code} - {rand.choice(SUBJECTS)}')
+            for province in PROVINCES:
+                lines.append(f'   PROVINCIA/PROVINCIA:   {province}')
+                for idx in range(per_section):
+                    if school_id - 800000 == rows:
+                        break
+                    city, city_id = rand.choice(CITIES)
+                    hours = rand.choice(['', '9', '18'])
+                    language = rand.choice(['', 'ING.'])
+                    lines.append(f'{idx+1}   {city} - {city_id} - IES {chr(65 + idx % 26)}     {school_id}   {hours}   '
+                                 f'{language}   NO   {rand.choice(TYPES)}')
+                    school_id += 1
+
+    return lines
+
+def parse_offert_lines_by_append(lines: list[str], candidate: dict[str, str], pattern: dict[str, str]) -> pd.DataFrame:
+    # former approach, one df.loc insert per row, kept here as reference only
+
+    df = pd.DataFrame(columns=continuaGV.DEFAULT_COLUMNS)
+
+    for line in lines:
+        code_match = pattern['code'].search(line)
+        province_match = pattern['province'].search(line)
+        school_match = pattern['school'].search(line)
+
+        if code_match:
+            code = get_param_in_match(code_match, 'code')
+            subject = get_param_in_match(code_match, 'subject')
+
+        if province_match:
+            province = get_param_in_match(province_match, 'province').upper()
+
+        if school_match and code in candidate['codes'] and province in candidate['provinces']:
+            values = [code, subject, province] + [get_param_in_match(school_match, field) for field in OFFERT_FIELDS[3:]]
+            df.loc[len(df)+1] = dict(zip(OFFERT_FIELDS, values))
+
+    return df
+
+def bench_offert_table(sizes: list[int]=SIZES) -> None:
+
+    candidate = dict(continuaGV.CANDIDATE, codes=['206', '207', '219'])
+    print(f'{"rows":>8} {"append (s)":>12} {"columnar (s)":>14} {"rows/s":>12}')
+
+    for size in sizes:
+        lines = continua_offert_lines(size, candidate['codes'])
+
+        append_time = None
+        if size <= MAX_APPEND_SIZE:
+            start = time.perf_counter()
+            parse_offert_lines_by_append(lines, candidate, continuaGV.OFFERT_PATTERN)
+            append_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        table = parse_offert_lines(lines, candidate, continuaGV.OFFERT_PATTERN)
+        df = offert_table_to_df(table, continuaGV.DEFAULT_COLUMNS)
+        columnar_time = time.perf_counter() - start
+
+        assert len(df) == size
+        append = f'{append_time:12.3f}' if append_time is not None else f'{"-":>12}'
+        print(f'{size:8d} {append} {columnar_time:14.3f} {size / columnar_time:12.0f}')
+
+def iter_matches_by_scan(lines: list[str], pattern: dict[str, str]):
+    # former approach, every pattern is searched in every line, kept here as reference only.
+    # Split candidate entries are joined as in iter_matches, so that only line classification is compared
+
+    def classify():
+        for number, line in enumerate(lines):
+            matches = {name: regex.search(line) for name, regex in pattern.items()}
+            yield number, line, {name: match.groupdict() for name, match in matches.items() if match}
+
+    if 'candidate' in pattern:
+        for _, matches in join_split_entries(classify(), pattern['candidate']):
+            yield matches
+        return
+
+    for _, _, matches in classify():
+        if matches:
+            yield matches
+
+def bench_lines(lines: list[str], pattern: dict[str, str], label: str) -> bool:
+    # throughput of both approaches, True if both give the same records
+
+    start = time.perf_counter()
+    scan = list(iter_matches_by_scan(lines, pattern))
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    guarded = list(iter_matches(lines, pattern))
+    guarded_time = time.perf_counter() - start
+
+    same = scan == guarded
+    print(f'{label:<40} {len(lines):9d} {len(lines) / scan_time:12.0f} {len(lines) / guarded_time:12.0f} '
+          f'{scan_time / guarded_time:7.1f}x {"OK" if same else "DIFFERENT"}')
+    return same
+
+def bench_line_classifier(pdf_files: list[Path]) -> None:
+    """
+    PURPOSE:
+
+        Compare lines/s of scanning every pattern vs line guards, and check that records are the same,
+        for synthetic lines and for every pdf given (examples pdfs if none is given)
+
+    MANDATORY ARGUMENTS:
+
+        pdf_files: list of pdf files, option and kind of pdf is told from its check line
+    """
+    print(f'{"input":<40} {"lines":>9} {"scan (l/s)":>12} {"guard (l/s)":>12} {"speedup":>8}')
+    lines = continua_offert_lines(LINES_SIZE, ['206', '207', '219'])
+    same = bench_lines(lines, continuaGV.OFFERT_PATTERN, 'synthetic continua offerts')
+
+    pdf_files = pdf_files or sorted(EXAMPLES_DIR.glob('*/*.pdf'))
+    for pdf_file in pdf_files:
+        for module in [dificilGV, continuaGV]:
+            for pattern, check_line in [(module.OFFERT_PATTERN, module.OFFERT_CHECK_LINE),
+                                        (module.RESULT_PATTERN, module.RESULT_CHECK_LINE)]:
+                try:
+                    lines = list(iter_pdf_lines(pdf_file, check_line))
+                except RuntimeError:
+                    continue
+                same = bench_lines(lines, pattern, f'{pdf_file.name} ({module.OPTION})') and same
+
+    if not same:
+        raise RuntimeError('Line guards give different records than scanning every pattern')
+
+def places_df(records: list[dict[str, dict]], module, candidate: dict[str, str]) -> pd.DataFrame:
+    # one row for every place of candidate codes in results, so every place is updated by result parsers
+
+    keys, code = [], None
+    for matches in records:
+        if 'code' in matches:
+            code = get_param_in_match(matches['code'], 'code')
+        if 'place' in matches and code in candidate['codes']:
+            keys.append((code, get_param_in_match(matches['place'], 'school_id'), get_param_in_match(matches['place'], 'city_id')))
+
+    df = pd.DataFrame(list(dict.fromkeys(keys)), columns=['code', 'school_id', 'city_id'])
+    df = df.reindex(columns=module.DEFAULT_COLUMNS + module.EXTRA_COLUMNS)
+    df.index = pd.RangeIndex(1, len(df)+1)
+    return df
+
+def is_same_parse(full: list[dict[str, dict]], sections: list[dict[str, dict]], module, kind: str,
+                  candidate: dict[str, str], df: pd.DataFrame) -> bool:
+    # True if parsers give the same from full and section records
+
+    if kind == 'offert':
+        return list(iter_offert_records(full, candidate)) == list(iter_offert_records(sections, candidate))
+    if module is dificilGV:
+        return parse_result_dificil_records(full, candidate, df.copy()).equals(
+            parse_result_dificil_records(sections, candidate, df.copy()))
+
+    full_df, full_stats = parse_result_continua_records(full, candidate, df.copy())
+    sections_df, sections_stats = parse_result_continua_records(sections, candidate, df.copy())
+    return full_df.equals(sections_df) and full_stats.equals(sections_stats)
+
+def bench_sections(pdf_files: list[Path], codes: list[str]) -> None:
+    """
+    PURPOSE:
+
+        Compare time of parsing every line vs indexing sections and parsing only sections of candidate codes
+        and provinces, and check that parsers give the same result with both, for every pdf given
+        (examples pdfs if none is given)
+
+    MANDATORY ARGUMENTS:
+
+        pdf_files: list of pdf files, option and kind of pdf is told from its check line
+        codes: candidate codes, codes of CANDIDATE in dificilGV or continuaGV if empty
+    """
+    print(f'{"input":<40} {"lines":>9} {"selected":>9} {"all (s)":>9} {"index (s)":>10} {"sections (s)":>13} {"speedup":>8}')
+    same = True
+
+    pdf_files = pdf_files or sorted(EXAMPLES_DIR.glob('*/*.pdf'))
+    for pdf_file in pdf_files:
+        for module in [dificilGV, continuaGV]:
+            for kind, pattern, check_line in [('offert', module.OFFERT_PATTERN, module.OFFERT_CHECK_LINE),
+                                              ('result', module.RESULT_PATTERN, module.RESULT_CHECK_LINE)]:
+                candidate = dict(module.CANDIDATE, codes=codes or module.CANDIDATE['codes'])
+                try:
+                    # also leaves text in cache, so times below do not include extraction
+                    sections = list(iter_pdf_matches(pdf_file, check_line, pattern, candidate=candidate))
+                except RuntimeError:
+                    continue
+
+                start = time.perf_counter()
+                lines = list(iter_pdf_lines(pdf_file, check_line, pages=iter_cached_pages(pdf_file, None)))
+                full = list(iter_matches(lines, pattern))
+                full_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                index = index_sections(pdf_file, check_line, pattern)
+                index_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                selected = 0
+                for section, state in enumerate(index['states']):
+                    if is_candidate_section(state, pattern, candidate):
+                        section_lines = list(iter_section_lines(pdf_file, index, section))
+                        list(iter_matches(section_lines, pattern))
+                        selected += len(section_lines)
+                sections_time = time.perf_counter() - start
+
+                df = places_df(full, module, candidate) if kind == 'result' else None
+                result_same = is_same_parse(full, sections, module, kind, candidate, df)
+                same = result_same and same
+
+                print(f'{pdf_file.name + " (" + module.OPTION + ")":<40} {len(lines):9d} {selected:9d} {full_time:9.3f} '
+                      f'{index_time:10.3f} {sections_time:13.3f} {full_time / sections_time:7.1f}x '
+                      f'{"OK" if result_same else "DIFFERENT"}')
+
+    if not same:
+        raise RuntimeError('Parsing only candidate sections gives different results than parsing every line')
+
+def synthetic_places(size: int, codes: list[str], rand: random.Random) -> list[tuple[str]]:
+    # (code, province, city, city_id, school_id) of size places, spread evenly among codes and provinces
+
+    places = []
+    for idx in range(size):
+        code = codes[idx * len(codes) // size]
+        province = SUITE_PROVINCES[idx * len(codes) * len(SUITE_PROVINCES) // size % len(SUITE_PROVINCES)]
+        city, city_id = rand.choice(CITIES)
+        places.append((code, province, city, city_id, str(800000 + idx)))
+
+    return places
+
+def synthetic_offert_lines(option: str, places: list[tuple[str]], rand: random.Random) -> list[str]:
+    # lines of offerts pdf of option in the layout matched by OFFERT_PATTERN, a header line for every code and province
+
+    lines = ['Llocs Ofertats/ Puestos Ofertados'] if option == 'continua' else ['CONVOCATÒRIA', 'LLOCS DE DIFÍCIL COBERTURA']
+    code, province = None, None
+
+    for idx, (place_code, place_province, city, city_id, school_id) in enumerate(places):
+        if place_code != code:
+            code, province = place_code, None
+            subject = rand.choice(SUBJECTS)
+            lines.append(f'   ESPECIALIDAD/ESPECIALITAT:   {code} - {subject}' if option == 'continua' else
+                         f'ESPECIALIDAD/ESPECIALITAT: {code} {subject}')
+        if place_province != province:
+            province = place_province
+            lines.append(f'   PROVINCIA/PROVINCIA:   {province.title()}' if option == 'continua' else
+                         f'PROVÍNCIA/PROVINCIA: {province}')
+
+        school_name = f'IES {chr(65 + idx % 26)}'
+        if option == 'continua':
+            lines.append(f'{idx+1}   {city} - {city_id} - {school_name}     {school_id}   {rand.choice(["", "9", "18"])}   '
+                         f'{rand.choice(["", "ING."])}   NO   {rand.choice(TYPES)}')
+        else:
+            lines.append(f'{city} - {city_id} - {school_name}    {school_id}   18   NO   Otros requisitos')
+
+    return lines
+
+def synthetic_result_lines(option: str, places: list[tuple[str]], size: int, rand: random.Random) -> list[str]:
+    # about size lines of results pdf of option in the layout matched by RESULT_PATTERN, for the first places
+
+    lines = ['ADJUDICACIÓ DE PERSONAL DOCENT INTERÍ DIA 13/01/2026', ''] if option == 'continua' else ['PARTICIPANTS I LLOCS', '']
+    code, position = None, 0
+
+    for place_code, _, city, city_id, school_id in places:
+        if len(lines) >= size:
+            break
+        if place_code != code:
+            code, position = place_code, 0
+            lines.append(f'     {code} {rand.choice(SUBJECTS)}' if option == 'continua' else f'   {code} {rand.choice(SUBJECTS)}')
+
+        if option == 'continua':
+            # some candidates are not assigned before the one assigned to place
+            for _ in range(rand.randint(0, 2)):
+                position += 1
+                lines.append(f'{position}   {rand.choice(SUITE_NAMES)}          1')
+                lines.append(f'        {rand.choice(["No adjudicat", "Ha participat", "Desactivat"])}')
+            position += 1
+            lines.append(f'{position}   {rand.choice(SUITE_NAMES)}          1')
+            lines.append(f'        {school_id} {city}({city_id})IES X      {code} / SUBJECT')
+            lines.append(f'        Jornada completa   {rand.choice(["VACANT", "SUBSTITUCIÓ DETERMINADA"])}   Adjudicat')
+        else:
+            lines.append(f'   PUESTO :   {school_id}   {city_id}')
+            for position in range(1, rand.randint(2, 6)):
+                assigned = '-->' if position == 1 else ''
+                name = rand.choice(SUITE_NAMES).replace(',', '')
+                lines.append(f'{position}   {assigned}   {name}   01/01/2023 10:00:00   1234567A   X   {rand.randint(1, 99)}   '
+                             f'S   N   {rand.randint(1, 5)}  {school_id}')
+
+    return lines
+
+def synthetic_pages(lines: list[str]) -> list[str]:
+    # pages as extracted from pdf, iter_pdf_lines gives the same lines with an empty one between pages
+
+    return ['\n'.join(lines[idx:idx+SUITE_PAGE_LINES]) for idx in range(0, len(lines), SUITE_PAGE_LINES)]
+
+@contextmanager
+def stub_geocoder():
+    # cities not in gazetteer and home get coordinates from their name, so no network is used
+
+    def fake_coordinates(city: str, city_id: str=None) -> tuple[float]:
+        digest = int(hashlib.md5(city.encode()).hexdigest(), 16)
+        return 38.0 + digest % 1000 / 500, -1.0 + digest // 1000 % 1000 / 700
+
+    resolve_cities, coordinates_of = utilsGV.resolve_cities, utilsGV.coordinates_of
+    utilsGV.resolve_cities = lambda cities: {city: fake_coordinates(*city) for city in cities}
+    utilsGV.coordinates_of = fake_coordinates
+    try:
+        yield
+    finally:
+        utilsGV.resolve_cities, utilsGV.coordinates_of = resolve_cities, coordinates_of
+
+def best_time(foo, repeats: int=3, budget: float=SUITE_BUDGET):
+    # best time of foo run at least repeats times and until budget seconds are spent, and its last result.
+    # Garbage is collected before runs and not during them, so time does not depend on earlier stages
+
+    best, spent, runs = None, 0.0, 0
+    gc.collect()
+    gc.disable()
+    try:
+        while runs < repeats or spent < budget:
+            start = time.perf_counter()
+            result = foo()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            spent += elapsed
+            runs += 1
+    finally:
+        gc.enable()
+
+    return best, result
+
+def bench_call(option: str, size: int, code_count: int, out_dir: Path) -> dict[str, float]:
+    """
+    PURPOSE:
+
+        Lines/s of every stage for a synthetic call of option, timing the offert table path of process_files:
+        lines (text to lines, as pdf text is read), match (line classification), offerts (parse_offert_records and
+        add_distance_values with geocoder stubbed), results (result updates of table and statistics) and write
+        (write_records)
+
+    MANDATORY ARGUMENTS:
+
+        option: dificil or continua
+        size: lines of offerts and results pdfs
+        code_count: number of specialty codes
+        out_dir: directory for csv
+    """
+    module = MODULES[option]
+    rand = random.Random(SEED)
+    codes = [str(200 + idx) for idx in range(code_count)]
+    places = synthetic_places(size, codes, rand)
+    candidate = {'home': 'Valencia', 'name': SUITE_NAMES[0].replace(',', ''), 'codes': codes, 'provinces': SUITE_PROVINCES}
+    columns = module.DEFAULT_COLUMNS + module.EXTRA_COLUMNS
+    result_updates = result_dificil_updates if option == 'dificil' else result_continua_updates
+    times = {}
+
+    offert_pages = synthetic_pages(synthetic_offert_lines(option, places, rand))
+    result_pages = synthetic_pages(synthetic_result_lines(option, places, size, rand))
+
+    times['lines'], offert_lines = best_time(
+        lambda: list(iter_pdf_lines(Path('offerts.pdf'), module.OFFERT_CHECK_LINE, pages=offert_pages)))
+    result_lines = list(iter_pdf_lines(Path('results.pdf'), module.RESULT_CHECK_LINE, pages=result_pages))
+
+    times['match'], offert_records = best_time(lambda: list(iter_matches(offert_lines, module.OFFERT_PATTERN)))
+    result_records = list(iter_matches(result_lines, module.RESULT_PATTERN))
+
+    with stub_geocoder():
+        times['offerts'], table = best_time(lambda: add_distance_values(parse_offert_records(iter(offert_records), candidate),
+                                                                        candidate))
+    if len(table['code']) != len(places):
+        raise RuntimeError(f'{len(table["code"])} offerts parsed out of {len(places)} generated for {option}')
+
+    def parse_results() -> dict[str, list]:
+        updates, entries = result_updates(iter(result_records), candidate, build_place_index(table))
+        result_stats(entries, option)
+        return apply_table_updates(dict(table), updates, RESULT_COLUMN_TYPES[option])
+
+    times['results'], table = best_time(parse_results)
+
+    times['write'], _ = best_time(lambda: write_records(table, columns, out_dir / f'{option}.csv'))
+
+    # throughput of offerts stages is by lines of offerts pdf and of results stage by lines of results pdf
+    return {stage: (len(result_lines) if stage == 'results' else len(offert_lines)) / elapsed for stage, elapsed in times.items()}
+
+def load_baseline(file: Path) -> dict[str, float]:
+
+    if not file.exists():
+        return {}
+
+    with open(file, encoding='utf-8') as f:
+        return json.load(f)
+
+def store_baseline(file: Path, baseline: dict[str, float]) -> None:
+
+    file.parent.mkdir(parents=True, exist_ok=True)
+    with open(file, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=1)
+
+def bench_suite(sizes: list[int], code_counts: list[int], baseline_file: Path, save: bool=False,
+                tolerance: float=SUITE_TOLERANCE) -> None:
+    """
+    PURPOSE:
+
+        Lines/s of every stage for synthetic calls of both options, of every size and number of codes.
+        Throughputs are compared with baseline and stages slower than baseline by more than tolerance are flagged,
+        baseline is replaced by this run if save is True
+
+    MANDATORY ARGUMENTS:
+
+        sizes: lines of pdfs
+        code_counts: numbers of specialty codes
+        baseline_file: json file with lines/s of every option, size, codes and stage
+    """
+    baseline = load_baseline(baseline_file)
+    current, regressions = {}, []
+
+    print(f'{"call":<24} ' + ' '.join(f'{stage + " (l/s)":>16}' for stage in SUITE_STAGES))
+    with tempfile.TemporaryDirectory() as out_dir:
+        for option in MODULES:
+            for size in sizes:
+                for code_count in code_counts:
+                    label = f'{option}/{size}/{code_count}'
+                    is_slow = lambda stage: throughput[stage] < (1 - tolerance) * baseline.get(f'{label}/{stage}', 0)
+                    throughput = bench_call(option, size, code_count, Path(out_dir))
+
+                    # a slow stage may be noise of a busy machine, so call is run again and best of both is kept
+                    if any(is_slow(stage) for stage in SUITE_STAGES):
+                        again = bench_call(option, size, code_count, Path(out_dir))
+                        throughput = {stage: max(throughput[stage], again[stage]) for stage in SUITE_STAGES}
+
+                    cells = []
+                    for stage in SUITE_STAGES:
+                        key = f'{label}/{stage}'
+                        current[key] = throughput[stage]
+                        slow = is_slow(stage)
+                        if slow:
+                            regressions.append(f'{key}: {throughput[stage]:.0f} l/s, baseline {baseline[key]:.0f} l/s')
+                        cells.append(f'{throughput[stage]:15.0f}{"!" if slow else " "}')
+                    print(f'{label:<24} ' + ' '.join(cells))
+
+    if save:
+        store_baseline(baseline_file, dict(baseline, **current))
+        print(f'Baseline stored in \'{baseline_file}\'')
+    elif not baseline:
+        print(f'No baseline in \'{baseline_file}\' yet, run with --save to store one')
+
+    if regressions:
+        print(f'Stages slower than baseline by more than {tolerance:.0%} (marked with !):')
+        for regression in regressions:
+            print(f' - {regression}')
+        if not save:
+            raise RuntimeError(f'{len(regressions)} throughput regressions')
+
+def startup_time(statement: str, runs: int=STARTUP_RUNS) -> tuple[float, str]:
+    # best wall time of a new interpreter running statement, and its output of last run
+
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', statement], cwd=Path(__file__).parent, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, output
+
+def bench_startup(modules: list[str]=STARTUP_MODULES, runs: int=STARTUP_RUNS) -> dict[str, float]:
+    """
+    PURPOSE:
+
+        Time cold start of every module, i.e. a new interpreter importing it, and tell which heavy dependencies
+        are loaded at import. Time of a bare interpreter is shown apart and taken out of module times
+
+    MANDATORY ARGUMENTS:
+
+        None
+    """
+    interpreter, _ = startup_time('pass', runs)
+    print(f'Cold start of {runs} runs (best), python {sys.version.split()[0]}:')
+    print(f' - interpreter: {interpreter*1000:.0f} ms')
+
+    times = {}
+    for module in modules:
+        statement = f'import sys, {module}; print(",".join(name for name in {HEAVY_MODULES} if name in sys.modules))'
+        elapsed, loaded = startup_time(statement, runs)
+        times[module] = elapsed - interpreter
+        print(f' - import {module}: {times[module]*1000:.0f} ms, loads {loaded.replace(",", ", ") or "none of them"}')
+
+    return times
+
+def print_help():
+
+    print('')
+    print('Usage:')
+    print('=====')
+    print('')
+    print(' python benchGV.py offert')
+    print(' python benchGV.py lines [/path/to/file.pdf ...]')
+    print(' python benchGV.py sections [/path/to/file.pdf ...] [--codes 206,207]')
+    print(' python benchGV.py suite [--sizes 1000,10000] [--codes 1,20] [--baseline /path/to/baseline.json] [--save] [--tolerance 0.2]')
+    print(' python benchGV.py startup [module ...]')
+    print('')
+    print(' - offert: time row accumulation in parse_offert_pdf with synthetic rows')
+    print(' - lines: lines/s of line classification and check of same records, for synthetic lines and pdfs')
+    print('   (examples pdfs if none is given)')
+    print(' - sections: time of parsing only sections of candidate codes and provinces vs every line, and check of same')
+    print('   results, for pdfs (examples pdfs if none is given) and codes (CANDIDATE codes if none is given)')
+    print(' - suite: lines/s of every stage (lines, match, offerts, results, write) of summaries for synthetic offerts and results of both')
+    print(f'   options, of every size in lines ({",".join(map(str, SUITE_SIZES))} by default) and number of codes')
+    print(f'   ({",".join(map(str, SUITE_CODES))} by default), geocoder is stubbed. Stages slower than baseline by more than')
+    print(f'   tolerance fail, --save stores this run as baseline (\'{BENCH_BASELINE_FILE}\' by default)')
+    print(f' - startup: cold start time of modules ({", ".join(STARTUP_MODULES)} by default) and which of')
+    print(f'   {", ".join(HEAVY_MODULES)} they load at import')
+    print('')
+
+def pop_option(args: list[str], option: str, default=None):
+    # value of option and args without it, default if option is not given
+
+    if option not in args:
+        return default, args
+
+    idx = args.index(option)
+    if idx + 1 == len(args):
+        print_help()
+        raise RuntimeError(f'Value of {option} is missing')
+
+    return args[idx+1], args[:idx] + args[idx+2:]
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ['offert', 'lines', 'sections', 'suite', 'startup'] or (sys.argv[1] == 'offert' and len(sys.argv) > 2):
+        print_help()
+        raise RuntimeError('Arguments are missing or incorrect')
+
+    args = sys.argv[2:]
+    codes, args = pop_option(args, '--codes', '') if sys.argv[1] in ['sections', 'suite'] else ('', args)
+
+    if sys.argv[1] == 'offert':
+        bench_offert_table()
+    elif sys.argv[1] == 'lines':
+        bench_line_classifier([Path(arg) for arg in args])
+    elif sys.argv[1] == 'sections':
+        bench_sections([Path(arg) for arg in args], codes.split(',') if codes else [])
+    elif sys.argv[1] == 'startup':
+        bench_startup(args if args else STARTUP_MODULES)
+    else:
+        sizes, args = pop_option(args, '--sizes')
+        baseline_file, args = pop_option(args, '--baseline', BENCH_BASELINE_FILE)
+        tolerance, args = pop_option(args, '--tolerance', SUITE_TOLERANCE)
+        save = '--save' in args
+        args = [arg for arg in args if arg != '--save']
+        if args:
+            print_help()
+            raise RuntimeError('Arguments are missing or incorrect')
+
+        bench_suite([int(size) for size in sizes.split(',')] if sizes else SUITE_SIZES,
+                    [int(code) for code in codes.split(',')] if codes else SUITE_CODES,
+                    Path(baseline_file), save=save, tolerance=float(tolerance))
@@ -0,0 +1,310 @@
+import os
+import re
+import sys
+import mmap
+import zlib
+import time
+import pickle
+import hashlib
+import itertools
+
+from array import array
+from pathlib import Path
+from collections.abc import Callable, Iterator
+from geocodeGV import CACHE_DIR
+from profileGV import count
+
+
+PDF_CACHE_DIR = CACHE_DIR / 'pdf'
+RECORDS_VERSION = 2  # increase if format of cached records changes
+CHECKPOINT_PAGES = int(os.environ.get('INTERIGV_CHECKPOINT_PAGES', 100))  # pages extracted between checkpoints
+STALE_TMP_SECONDS = 3600  # tmp files of pdf not written for this long were left by killed runs
+
+_digests = {}
+
+def file_digest(file: Path) -> str:
+    # sha256 of file content, memoized by path, size and modification time
+
+    stat = os.stat(file)
+    key = (str(Path(file).resolve()), stat.st_size, stat.st_mtime_ns)
+
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _digests[key] = digest.hexdigest()
+
+    return _digests[key]
+
+def pattern_digest(pattern: dict[str, re.Pattern], *extra) -> str:
+    # changes if any regex, its flags or anything in extra changes
+
+    digest = hashlib.sha256(f'{RECORDS_VERSION}'.encode())
+    for name in sorted(pattern):
+        digest.update(f'{name}\0{pattern[name].pattern}\0{pattern[name].flags}\0'.encode())
+    for item in extra:
+        digest.update(repr(item).encode())
+
+    return digest.hexdigest()[:16]
+
+def checkpoint_file(key: str, first: int) -> Path:
+
+    return PDF_CACHE_DIR / f'{key}.{first:06d}.part'
+
+def load_checkpoints(key: str) -> list[str]:
+    # pages of consecutive checkpoints from first page, left by runs interrupted while extracting pdf
+
+    pages = []
+    while True:
+        checkpoint = load_object(checkpoint_file(key, len(pages)))
+        if checkpoint is None:
+            return pages
+        pages.extend(checkpoint)
+
+def iter_cached_pages(file: Path, iter_source: Callable[[int], Iterator[str]]) -> Iterator[str]:
+    """
+    PURPOSE:
+
+        Yield page texts of pdf from cache, text is memory mapped and pages are located with an offsets file.
+        If pdf is not in cache yet, pages come from iter_source and are stored as they are yielded. Every
+        CHECKPOINT_PAGES pages extracted are also kept in a checkpoint, so if run is interrupted the next one
+        resumes extraction from the last checkpoint. Checkpoints only depend on pdf content, so runs extracting
+        the same pdf at once write the same checkpoints
+
+    MANDATORY ARGUMENTS:
+
+        file: pdf file
+        iter_source: function returning iterator of page texts from a given page, only called if pdf is not in cache
+    """
+    key = file_digest(file)
+    text_file = PDF_CACHE_DIR / f'{key}.txt'
+    offsets_file = PDF_CACHE_DIR / f'{key}.idx'
+
+    if offsets_file.exists() and text_file.exists():
+        offsets = array('q')
+        offsets.frombytes(offsets_file.read_bytes())
+
+        if offsets[-1] == 0:
+            yield from ('' for _ in offsets[1:])
+            return
+
+        with open(text_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as text:
+            for first, last in zip(offsets, offsets[1:]):
+                yield text[first:last].decode('utf-8')
+        return
+
+    # offsets file is written last, so a partial text file is never read
+    PDF_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = Path(f'{text_file}.{os.getpid()}.tmp')
+    offsets = array('q', [0])
+    resumed = load_checkpoints(key)
+    pending = []  # pages extracted since last checkpoint
+    count('pages_resumed', len(resumed))
+
+    # tmp file is removed if extraction fails or generator is closed before the last page
+    try:
+        with open(tmp_file, 'wb') as f:
+            for number, page in enumerate(itertools.chain(resumed, iter_source(len(resumed)))):
+                data = page.encode('utf-8')
+                f.write(data)
+                offsets.append(offsets[-1] + len(data))
+
+                if number >= len(resumed):
+                    pending.append(page)
+                    if len(pending) == CHECKPOINT_PAGES:
+                        store_object(checkpoint_file(key, number + 1 - len(pending)), pending)
+                        pending = []
+
+                yield page
+
+        os.replace(tmp_file, text_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+
+    tmp_file = Path(f'{offsets_file}.{os.getpid()}.tmp')
+    tmp_file.write_bytes(offsets.tobytes())
+    os.replace(tmp_file, offsets_file)
+
+    for checkpoint in PDF_CACHE_DIR.glob(f'{key}.*.part'):
+        checkpoint.unlink(missing_ok=True)
+
+    # tmp files of runs extracting same pdf right now are still being written, so only old ones are removed
+    for tmp_file in PDF_CACHE_DIR.glob(f'{key}.*.tmp'):
+        try:
+            if time.time() - tmp_file.stat().st_mtime > STALE_TMP_SECONDS:
+                tmp_file.unlink()
+        except FileNotFoundError:
+            pass
+
+def iter_cached_page_range(file: Path, first: int, last: int) -> Iterator[str]:
+    # page texts from first to last (not included), pdf text must be in cache already
+
+    key = file_digest(file)
+    offsets = array('q')
+    offsets.frombytes((PDF_CACHE_DIR / f'{key}.idx').read_bytes())
+    last = min(last, len(offsets) - 1)
+
+    if offsets[-1] == 0:
+        yield from ('' for _ in range(first, last))
+        return
+
+    with open(PDF_CACHE_DIR / f'{key}.txt', 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as text:
+        for page in range(first, last):
+            yield text[offsets[page]:offsets[page+1]].decode('utf-8')
+
+def has_cached_pages(file: Path) -> bool:
+
+    key = file_digest(file)
+    return (PDF_CACHE_DIR / f'{key}.idx').exists() and (PDF_CACHE_DIR / f'{key}.txt').exists()
+
+def records_file(file: Path, pattern: dict[str, re.Pattern], *extra, suffix: str='records') -> Path:
+
+    return PDF_CACHE_DIR / f'{file_digest(file)}-{pattern_digest(pattern, *extra)}.{suffix}'
+
+def load_object(cache_file: Path):
+
+    return pickle.loads(zlib.decompress(cache_file.read_bytes())) if cache_file.exists() else None
+
+def store_object(cache_file: Path, obj) -> None:
+
+    PDF_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = Path(f'{cache_file}.{os.getpid()}.tmp')
+    tmp_file.write_bytes(zlib.compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), 1))
+    os.replace(tmp_file, cache_file)
+
+def encode_record(record: dict[str, dict], groups: dict[str, tuple]) -> tuple:
+
+    return tuple((name, tuple(match[group] for group in groups[name])) for name, match in record.items())
+
+def decode_record(encoded: tuple, groups: dict[str, tuple]) -> dict[str, dict]:
+
+    return {name: dict(zip(groups[name], values)) for name, values in encoded}
+
+def load_records(file: Path, pattern: dict[str, re.Pattern], *extra) -> list[dict[str, dict]] | None:
+    """
+    PURPOSE:
+
+        Get parsed records of pdf (matched groups of every pattern, line by line) from cache, None if not in cache
+
+    MANDATORY ARGUMENTS:
+
+        file: pdf file
+        pattern: patterns records were parsed with
+    """
+    cached = load_object(records_file(file, pattern, *extra))
+    if cached is None:
+        return None
+
+    groups, encoded = cached
+    return [decode_record(record, groups) for record in encoded]
+
+def store_records(
+    file: Path,
+    pattern: dict[str, re.Pattern],
+    records: Iterator[dict[str, dict]],
+    *extra,
+) -> Iterator[dict[str, dict]]:
+    """
+    PURPOSE:
+
+        Yield records and store them in cache once all of them have been yielded.
+        Records are kept as tuples of values with group names stored once per pattern
+
+    MANDATORY ARGUMENTS:
+
+        file: pdf file
+        pattern: patterns records were parsed with
+        records: matched groups of every pattern, line by line
+    """
+    groups = {name: tuple(regex.groupindex) for name, regex in pattern.items()}
+    encoded = []
+
+    for record in records:
+        encoded.append(encode_record(record, groups))
+        yield record
+
+    store_object(records_file(file, pattern, *extra), (groups, encoded))
+
+def load_section_records(
+    file: Path,
+    pattern: dict[str, re.Pattern],
+    chunk: int,
+    *extra,
+) -> dict[int, list[dict[str, dict]]]:
+    """
+    PURPOSE:
+
+        Get parsed records of the sections of a chunk of pdf from cache, sections not in cache are left out
+
+    MANDATORY ARGUMENTS:
+
+        file: pdf file
+        pattern: patterns records were parsed with
+        chunk: chunk number, sections are kept in a file per chunk of consecutive sections
+    """
+    cached = load_object(records_file(file, pattern, *extra, suffix=f'{chunk:05d}.sections'))
+    if cached is None:
+        return {}
+
+    groups, encoded = cached
+    return {section: [decode_record(record, groups) for record in section_records]
+            for section, section_records in encoded.items()}
+
+def store_section_records(
+    file: Path,
+    pattern: dict[str, re.Pattern],
+    chunk: int,
+    records: dict[int, list[dict[str, dict]]],
+    *extra,
+) -> None:
+    """
+    PURPOSE:
+
+        Add parsed records of some sections of a chunk of pdf to cache, sections of chunk already in cache are kept.
+        Only the file of chunk is written, so storing many chunks does not write the same records again
+
+    MANDATORY ARGUMENTS:
+
+        file: pdf file
+        pattern: patterns records were parsed with
+        chunk: chunk number of sections
+        records: records by section number
+    """
+    cache_file = records_file(file, pattern, *extra, suffix=f'{chunk:05d}.sections')
+    groups = {name: tuple(regex.groupindex) for name, regex in pattern.items()}
+    _, encoded = load_object(cache_file) or (groups, {})
+
+    for section, section_records in records.items():
+        encoded[section] = [encode_record(record, groups) for record in section_records]
+
+    store_object(cache_file, (groups, encoded))
+
+def clear_pdf_cache() -> int:
+
+    files = list(PDF_CACHE_DIR.glob('*')) if PDF_CACHE_DIR.exists() else []
+    for file in files:
+        file.unlink()
+
+    return len(files)
+
+def print_help():
+
+    print('')
+    print('Usage:')
+    print('=====')
+    print('')
+    print(' python cacheGV.py clear')
+    print('')
+    print(' - clear: remove extracted text and parsed records of every pdf')
+    print('')
+    print(f' Cache is kept in \'{PDF_CACHE_DIR}\'')
+    print('')
+
+if __name__ == '__main__':
+
+    if len(sys.argv) != 2 or sys.argv[1] not in ['clear']:
+        print_help()
+        raise RuntimeError('Arguments are missing or incorrect')
+
+    print(f'{clear_pdf_cache()} files removed from \'{PDF_CACHE_DIR}\'')
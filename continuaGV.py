@@ -1,7 +1,7 @@
 import re
 
 from pathlib import Path
-from utilsGV import process_files, process_args, SPECIAL_ALPHA_CHARS, SPECIAL_ALPHANUMERIC_CHARS
+from utilsGV import process_files, process_args, province_regex, ALL_PROVINCES, SPECIAL_ALPHA_CHARS, SPECIAL_ALPHANUMERIC_CHARS
 
 
 ### USER OPTIONS
@@ -39,11 +39,9 @@ RESULT_PATTERN = {}
 p = f'^ +ESPECIALIDAD/ESPECIALITAT: +(?P<code>[0-9A-Z]{{3}}) - (?P<subject>[{SPECIAL_ALPHA_CHARS}]+)'
 OFFERT_PATTERN['code'] = re.compile(p, re.MULTILINE | re.ASCII)
 
-province_list = [f'{province.upper()}' for province in CANDIDATE['provinces']]
-province_list += [f'{province.title()}' for province in CANDIDATE['provinces']]
-province_pattern = '|'.join(province_list)
-p = f'^ +PROVINCIA/PROVINCIA: +(?P<province>{province_pattern})'
-OFFERT_PATTERN['province'] = re.compile(p, re.MULTILINE | re.ASCII)
+PROVINCE_TEMPLATE = '^ +PROVINCIA/PROVINCIA: +(?P<province>{provinces})'  # filled with provinces in province_regex
+# every province is parsed and records are filtered by candidate provinces, so cached records do not depend on them
+OFFERT_PATTERN['province'] = province_regex(PROVINCE_TEMPLATE, ALL_PROVINCES)
 
 # TODO: 'Centre singular' may appear after itinerant and will be read in type, create new variable
 p = f'^\d+ +(?P<city>[{SPECIAL_ALPHA_CHARS}]+) - (?P<city_id>\d+) - (?P<school_name>[{SPECIAL_ALPHANUMERIC_CHARS}]+?) +(?P<school_id>\d+) +(?P<hours>\d*) +(?P<language>[A-Z.]*) +(?P<itinerant>[SINO]+) +(?P<type>.*)'
@@ -67,10 +65,13 @@ def print_help():
     print('Usage:')
     print('=====')
     print('')
-    print(' python continuaGV.py /path/to/offerts.pdf [/path/to/results.pdf]')
+    print(' python continuaGV.py /path/to/offerts.pdf [/path/to/results.pdf] [--profile] [--cprofile] [--parquet]')
     print('')
     print(' - offerts.pdf: pdf file with place offerts')
     print(' - results.pdf: pdf file with final results (optional, if included more info is shown in summary)')
+    print(' - --profile: write json report with time of every stage, counters and peak memory next to summary')
+    print(' - --cprofile: also write a cProfile dump of every stage')
+    print(' - --parquet: also write summary as parquet for analytics (needs pandas and pyarrow)')
     print('')
     print(' Download pdfs in \'https://ceice.gva.es/es/web/rrhh-educacion/convocatoria-y-peticion-telematica\' and ')
     print(' \'https://ceice.gva.es/es/web/rrhh-educacion/resolucion\'')
@@ -85,8 +86,9 @@ if __name__ == '__main__':
         pdf_result_file = Path(r'examples/continua/260113_lis_sec.pdf')
         if not pdf_result_file.exists():
             pdf_result_file = None
+        parquet = False
     else:
-        pdf_offert_file, pdf_result_file = process_args(print_help)
+        pdf_offert_file, pdf_result_file, parquet = process_args(print_help)
 
     process_files(
         pdf_offert_file,
@@ -99,5 +101,6 @@ if __name__ == '__main__':
         RESULT_CHECK_LINE,
         DEFAULT_COLUMNS,
         EXTRA_COLUMNS,
-        debug=DEBUG
+        debug=DEBUG,
+        parquet=parquet,
     )
@@ -0,0 +1,398 @@
+import os
+import re
+import sys
+import csv
+import time
+import sqlite3
+import threading
+import unicodedata
+import numpy as np
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from profileGV import count
+
+
+DEFAULT_TIMEOUT = 10
+GEOCODER_DOMAIN = os.environ.get('INTERIGV_GEOCODER_DOMAIN', 'nominatim.openstreetmap.org')
+GEOCODER_SCHEME = os.environ.get('INTERIGV_GEOCODER_SCHEME', 'https')
+GEOCODE_RATE = float(os.environ.get('INTERIGV_GEOCODE_RATE', 1.0))  # requests per second, Nominatim policy is 1
+GEOCODE_WORKERS = 4
+GEOCODE_RETRIES = 3
+GEOCODE_BACKOFF = 2.0  # seconds, doubled after each failed attempt
+GEOCODE_TTL_DAYS = 180
+GEOCODE_MAX_ENTRIES = 20000
+GAZETTEER_FILE = Path(__file__).with_name('gazetteerGV.csv')
+WGS84_A = 6378.137  # semi-major axis in km
+WGS84_F = 1 / 298.257223563
+
+
+def user_cache_dir() -> Path:
+    """
+    PURPOSE:
+
+        Get directory where interiGV keeps its caches, INTERIGV_CACHE_DIR overrides default
+
+    MANDATORY ARGUMENTS:
+
+        None
+    """
+    if 'INTERIGV_CACHE_DIR' in os.environ:
+        return Path(os.environ['INTERIGV_CACHE_DIR'])
+
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA', Path.home() / 'AppData' / 'Local')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')
+
+    return Path(base) / 'interiGV'
+
+CACHE_DIR = user_cache_dir()
+GEOCODE_CACHE_FILE = CACHE_DIR / 'geocode.sqlite'
+
+def normalize_city(city: str) -> str:
+
+    return re.sub(r'\s+', ' ', city).strip().upper()
+
+def gazetteer_name(city: str) -> str:
+    # name without accents and article, e.g. POBLA DE VALLBONA (LA) and La Pobla de Vallbona are the same town
+
+    city = ''.join(char for char in unicodedata.normalize('NFKD', city) if not unicodedata.combining(char))
+    city = normalize_city(city).replace('’', "'")
+    city = re.sub(r"\s*\((EL|LA|LOS|LAS|LES|ELS|L')\)$", '', city)
+    return re.sub(r"^(EL|LA|LOS|LAS|LES|ELS) |^L'", '', city).strip()
+
+class GeocodeCache:
+    """
+    PURPOSE:
+
+        Persistent city -> (lat, lon) table in SQLite, keyed by normalized city name and GVA city_id
+
+    MANDATORY ARGUMENTS:
+
+        None
+    """
+
+    def __init__(self, file: Path=GEOCODE_CACHE_FILE, ttl_days: float=GEOCODE_TTL_DAYS, max_entries: int=GEOCODE_MAX_ENTRIES):
+
+        self.file = Path(file)
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.file.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.file, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS cities ('
+                        'name TEXT NOT NULL, city_id TEXT NOT NULL, latitude REAL, longitude REAL, updated REAL, '
+                        'PRIMARY KEY (name, city_id))')
+        self.db.execute('CREATE INDEX IF NOT EXISTS cities_city_id ON cities (city_id)')
+        self.evict()
+
+    def get(self, city: str, city_id: str=None) -> tuple[float] | None:
+
+        oldest = time.time() - self.ttl
+        with self.lock:
+            row = None
+            if city_id:
+                row = self.db.execute('SELECT latitude, longitude FROM cities WHERE city_id = ? AND updated >= ?',
+                                      (city_id, oldest)).fetchone()
+            if not row:
+                row = self.db.execute('SELECT latitude, longitude FROM cities WHERE name = ? AND updated >= ?',
+                                      (normalize_city(city), oldest)).fetchone()
+        return tuple(row) if row else None
+
+    def put(self, city: str, coordinates: tuple[float], city_id: str=None) -> None:
+
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO cities VALUES (?, ?, ?, ?, ?)',
+                            (normalize_city(city), city_id or '', coordinates[0], coordinates[1], time.time()))
+
+    def evict(self) -> int:
+        # drop expired entries and then the oldest ones above max_entries
+
+        with self.lock, self.db:
+            removed = self.db.execute('DELETE FROM cities WHERE updated < ?', (time.time() - self.ttl,)).rowcount
+            removed += self.db.execute('DELETE FROM cities WHERE rowid NOT IN '
+                                       '(SELECT rowid FROM cities ORDER BY updated DESC LIMIT ?)',
+                                       (self.max_entries,)).rowcount
+        return removed
+
+    def __len__(self) -> int:
+
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM cities').fetchone()[0]
+
+class Gazetteer:
+    """
+    PURPOSE:
+
+        Offline city name -> (lat, lon) table for towns of the Comunitat Valenciana, backed by numpy arrays.
+        Lookup is by name only, since GVA city_id is a school code and not a municipality code. Names are
+        compared with gazetteer_name and a locality (e.g. ELX - TORRELLANO) not in gazetteer gets coordinates
+        of its municipality
+
+    MANDATORY ARGUMENTS:
+
+        None
+    """
+
+    def __init__(self, file: Path=GAZETTEER_FILE):
+
+        rows = []
+        if Path(file).exists():
+            with open(file, newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+
+        # a name is given coordinates of its first row
+        self.latitude = np.array([float(row['latitude']) for row in rows])
+        self.longitude = np.array([float(row['longitude']) for row in rows])
+        self.names = {}
+        for idx, row in enumerate(rows):
+            self.names.setdefault(gazetteer_name(row['city']), idx)
+
+    def coordinates_of(self, city: str) -> tuple[float] | None:
+
+        idx = self.names.get(gazetteer_name(city))
+        if idx is None:
+            idx = self.names.get(gazetteer_name(city.split(' - ')[0]))
+        return None if idx is None else (self.latitude[idx], self.longitude[idx])
+
+    def __len__(self) -> int:
+
+        return len(self.latitude)
+
+def geodesic_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    # Lambert's formula on WGS-84, within 1 m of geopy's geodesic for distances inside the Comunitat Valenciana
+
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    beta1 = np.arctan((1 - WGS84_F) * np.tan(lat1))
+    beta2 = np.arctan((1 - WGS84_F) * np.tan(lat2))
+    h = np.sin((beta2 - beta1) / 2)**2 + np.cos(beta1) * np.cos(beta2) * np.sin((lon2 - lon1) / 2)**2
+    sigma = 2 * np.arcsin(np.sqrt(h))
+    p, q = (beta1 + beta2) / 2, (beta2 - beta1) / 2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (sigma - np.sin(sigma)) * (np.sin(p) * np.cos(q))**2 / np.cos(sigma / 2)**2
+        y = (sigma + np.sin(sigma)) * (np.cos(p) * np.sin(q))**2 / np.sin(sigma / 2)**2
+        distance = WGS84_A * (sigma - WGS84_F / 2 * (x + y))
+
+    return np.where(sigma == 0, 0.0, distance)
+
+class RateLimiter:
+    """
+    PURPOSE:
+
+        Space out calls shared by several threads so that no more than rate calls per second are done
+
+    MANDATORY ARGUMENTS:
+
+        rate: calls per second
+    """
+
+    def __init__(self, rate: float):
+
+        self.interval = 1 / rate
+        self.lock = threading.Lock()
+        self.next_call = 0
+
+    def wait(self) -> None:
+
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_call)
+            self.next_call = start + self.interval
+        time.sleep(start - now)
+
+_cache = None
+_gazetteer = None
+_limiter = RateLimiter(GEOCODE_RATE)
+_resolved = {}
+
+def gazetteer() -> Gazetteer:
+
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer()
+    return _gazetteer
+
+def geocode_cache() -> GeocodeCache:
+
+    global _cache
+    if _cache is None:
+        _cache = GeocodeCache()
+    return _cache
+
+def nominatim_coordinates_of(city: str, retries: int=GEOCODE_RETRIES) -> tuple[float]:
+    # rate limited and retried with exponential backoff when service fails, a city unknown to Nominatim is not retried.
+    # geopy is only imported here, so runs with every city in gazetteer or geocode cache never load it
+    from geopy.exc import GeocoderServiceError
+    from geopy.geocoders import Nominatim
+
+    geocoder = Nominatim(user_agent="GetLoc", timeout=DEFAULT_TIMEOUT, domain=GEOCODER_DOMAIN, scheme=GEOCODER_SCHEME)
+
+    for attempt in range(retries + 1):
+        _limiter.wait()
+        try:
+            loc = geocoder.geocode(city)
+            break
+        except GeocoderServiceError as error:
+            if attempt == retries:
+                raise ValueError(f'Point \'{city}\' not found ({error})') from error
+            time.sleep(GEOCODE_BACKOFF * 2**attempt)
+
+    if not loc:
+        raise ValueError(f'Point \'{city}\' not found')
+    return (loc.latitude, loc.longitude)
+
+def known_coordinates_of(city: str, city_id: str=None) -> tuple[float] | None:
+    # look up in process memory, gazetteer and then in disk cache, no network
+
+    key = city_id or normalize_city(city)
+    if key not in _resolved:
+        coordinates = gazetteer().coordinates_of(city) or geocode_cache().get(city, city_id)
+        if not coordinates:
+            return None
+        _resolved[key] = coordinates
+
+    return _resolved[key]
+
+def coordinates_of(city: str, city_id: str=None) -> tuple[float]:
+    # ask Nominatim only if city is not known yet
+
+    coordinates = known_coordinates_of(city, city_id)
+    if not coordinates:
+        coordinates = nominatim_coordinates_of(city)
+        geocode_cache().put(city, coordinates, city_id)
+        _resolved[city_id or normalize_city(city)] = coordinates
+
+    return coordinates
+
+def resolve_cities(cities: list[tuple[str, str]], workers: int=GEOCODE_WORKERS, verbose: bool=True) -> dict[tuple[str, str], tuple[float] | None]:
+    """
+    PURPOSE:
+
+        Get coordinates of many cities at once, unknown cities are requested to Nominatim
+        from a thread pool sharing one rate limiter, cities not found are mapped to None
+
+    MANDATORY ARGUMENTS:
+
+        cities: list of (city, city_id) pairs, city_id may be None
+    """
+    coordinates = {city: known_coordinates_of(*city) for city in dict.fromkeys(cities)}
+    queries = {}
+    for city, city_id in (city for city in coordinates if not coordinates[city]):
+        queries.setdefault(normalize_city(city), []).append((city, city_id))
+
+    count('geocode_cache_hits', sum(1 for city in coordinates if coordinates[city]))
+    count('geocode_misses', len(queries))
+
+    if not queries:
+        return coordinates
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(nominatim_coordinates_of, query): query for query in queries}
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            query = futures[future]
+            try:
+                result = future.result()
+            except ValueError as error:
+                errors.append(error)
+                result = None
+
+            for city, city_id in queries[query]:
+                coordinates[(city, city_id)] = result
+                if result:
+                    geocode_cache().put(city, result, city_id)
+                    _resolved[city_id or query] = result
+
+            if verbose is True:
+                print(f' Geocoded {done}/{len(queries)} cities', end='\r' if done < len(queries) else '\n')
+
+    for error in errors:
+        print(f' Warning: {error}, distance is left empty')
+
+    return coordinates
+
+def warm_geocode_cache(cities: list[tuple[str, str]]) -> int:
+    """
+    PURPOSE:
+
+        Geocode and store every (city, city_id) not yet in cache
+
+    MANDATORY ARGUMENTS:
+
+        cities: list of (city, city_id) pairs, city_id may be None
+    """
+    cities = [city for city in dict.fromkeys(cities) if not geocode_cache().get(*city)]
+    resolve_cities(cities)
+
+    return len(cities)
+
+def build_gazetteer(file: Path=GAZETTEER_FILE) -> int:
+    """
+    PURPOSE:
+
+        Add every cached city whose name is not in the gazetteer file yet, rows already in it are kept
+        as they are. Rows are sorted by gazetteer_name
+
+    MANDATORY ARGUMENTS:
+
+        None
+    """
+    entries = {}
+    if Path(file).exists():
+        with open(file, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                entries.setdefault(gazetteer_name(row['city']), row)
+
+    with geocode_cache().lock:
+        rows = geocode_cache().db.execute('SELECT name, latitude, longitude FROM cities').fetchall()
+
+    for city, latitude, longitude in rows:
+        entries.setdefault(gazetteer_name(city), {'city': city, 'latitude': f'{latitude:.5f}', 'longitude': f'{longitude:.5f}'})
+
+    with open(file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['city', 'latitude', 'longitude'])
+        writer.writeheader()
+        writer.writerows(entries[name] for name in sorted(entries))
+
+    return len(entries)
+
+def cities_in_csv(csv_file: Path) -> list[tuple[str, str]]:
+
+    with open(csv_file, newline='') as f:
+        dialect = csv.Sniffer().sniff(f.readline(), delimiters=',;')
+        f.seek(0)
+        return [(row['city'], row.get('city_id')) for row in csv.DictReader(f, dialect=dialect) if row.get('city')]
+
+def print_help():
+
+    print('')
+    print('Usage:')
+    print('=====')
+    print('')
+    print(' python geocodeGV.py warm /path/to/summary.csv [/path/to/other.csv ...]')
+    print(' python geocodeGV.py evict')
+    print(' python geocodeGV.py gazetteer')
+    print('')
+    print(' - warm: geocode every city in CSV summaries not yet in cache')
+    print(' - evict: remove expired entries from cache')
+    print(' - gazetteer: add cached cities not yet in the offline gazetteer')
+    print('')
+    print(f' Cache is kept in \'{GEOCODE_CACHE_FILE}\' and gazetteer in \'{GAZETTEER_FILE}\'')
+    print('')
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ['warm', 'evict', 'gazetteer']:
+        print_help()
+        raise RuntimeError('Arguments are missing or incorrect')
+
+    if sys.argv[1] == 'warm':
+        cities = [city for csv_file in sys.argv[2:] for city in cities_in_csv(Path(csv_file))]
+        print(f'{warm_geocode_cache(cities)} new cities in \'{GEOCODE_CACHE_FILE}\'')
+    elif sys.argv[1] == 'evict':
+        print(f'{geocode_cache().evict()} entries removed from \'{GEOCODE_CACHE_FILE}\'')
+    else:
+        print(f'{build_gazetteer()} cities in \'{GAZETTEER_FILE}\'')
@@ -0,0 +1,291 @@
+import os
+import re
+import sys
+import json
+import importlib.util
+import pandas as pd
+
+import dificilGV
+import continuaGV
+from pathlib import Path
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from cacheGV import file_digest
+from utilsGV import extract_pages, iter_pdf_matches, parse_offert_records, offert_table_to_df, parse_result_dificil_records, \
+    parse_result_continua_records, atomic_file, ALL_PROVINCES, EXTRACT_WORKERS
+
+
+MODULES = {'dificil': dificilGV, 'continua': continuaGV}
+HIST_COLUMNS = ['code', 'subject', 'province', 'city', 'city_id', 'school_name', 'school_id', 'hours',
+                'language', 'itinerant', 'type', 'other', 'winner', 'total', 'groups']
+HIST_CATEGORICAL_COLUMNS = ['code', 'subject', 'province', 'type']
+HIST_NUMERIC_COLUMNS = ['winner', 'total']
+MANIFEST_FILE = '_manifest.json'  # files starting with _ are not read as part of dataset by parquet readers
+INGEST_WORKERS = int(os.environ.get('INTERIGV_INGEST_WORKERS', EXTRACT_WORKERS))
+
+
+def require_pyarrow() -> None:
+    # pyarrow is optional and never imported here, pandas loads it when dataset is written or read
+
+    if importlib.util.find_spec('pyarrow') is None:
+        raise ImportError('pyarrow is needed for historical dataset, install it with \'pip install pyarrow\'')
+
+def pdf_date(file: Path) -> str | None:
+    # date of call from leading yymmdd of file name, e.g. 230929_pue_prov.pdf -> 2023-09-29
+
+    match = re.match(r'(\d{2})(\d{2})(\d{2})', file.stem)
+    return f'20{match[1]}-{match[2]}-{match[3]}' if match else None
+
+def pdf_kind(file: Path) -> tuple[str, str] | None:
+    # option and kind (offert or result) of pdf told from its first page, None if it is not a known pdf
+    import pdftotext  # 2.1.6 must be used, pdftotext > 2.1.6 has undesired result
+
+    try:
+        pages = extract_pages(file, 0, 1)
+    except pdftotext.Error:
+        return None
+    lines = pages[0].split('\n') if pages else []
+
+    for option, module in MODULES.items():
+        for kind, check_line in [('offert', module.OFFERT_CHECK_LINE), ('result', module.RESULT_CHECK_LINE)]:
+            if len(lines) > check_line['idx'] and lines[check_line['idx']].strip().startswith(check_line['text']):
+                return option, kind
+
+    return None
+
+def load_manifest(dataset_dir: Path) -> dict[str, dict]:
+
+    manifest_file = dataset_dir / MANIFEST_FILE
+    if (dataset_dir / 'manifest.json').exists() and not manifest_file.exists():
+        os.replace(dataset_dir / 'manifest.json', manifest_file)  # former name, dataset could not be read with it
+    if not manifest_file.exists():
+        return {'files': {}, 'calls': {}}
+
+    with open(manifest_file, encoding='utf-8') as f:
+        return json.load(f)
+
+def store_manifest(dataset_dir: Path, manifest: dict[str, dict]) -> None:
+
+    manifest_file = dataset_dir / MANIFEST_FILE
+    with atomic_file(manifest_file) as tmp_file:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, ensure_ascii=False)
+
+def find_calls(pdf_dir: Path, files: dict[str, dict]) -> dict[str, dict[str, Path]]:
+    """
+    PURPOSE:
+
+        Get offerts and results pdfs of every call in directory (and subdirectories), calls are told apart by option
+        and date in file name. Option and kind of every pdf are kept in files, so each pdf is only opened once
+
+    MANDATORY ARGUMENTS:
+
+        pdf_dir: directory with pdfs
+        files: option and kind by pdf digest, updated with new pdfs
+    """
+    calls = {}
+
+    for file in sorted(pdf_dir.rglob('*.pdf')):
+        digest = file_digest(file)
+
+        if digest not in files:
+            kind = pdf_kind(file)
+            files[digest] = {'file': str(file), 'option': kind[0] if kind else None, 'kind': kind[1] if kind else None}
+
+        # date is always taken from file name, same pdf may be kept with another name
+        entry = dict(files[digest], date=pdf_date(file))
+        if entry['option'] is None or entry['date'] is None:
+            print(f' Warning: \'{file}\' is not an offerts or results pdf with date in name, it is skipped')
+            continue
+
+        call = calls.setdefault(f'{entry["option"]}/{entry["date"]}', {'offert': None, 'result': None})
+        if call[entry['kind']] is not None:
+            print(f' Warning: \'{file}\' is another {entry["kind"]} pdf for {entry["option"]} on {entry["date"]}, it is skipped')
+            continue
+        call[entry['kind']] = file
+
+    return calls
+
+def to_history_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    # same columns and dtypes for every call and option, so all partitions share one schema
+
+    df = df.reindex(columns=HIST_COLUMNS)
+    for column in HIST_COLUMNS:
+        if column in HIST_CATEGORICAL_COLUMNS:
+            df[column] = df[column].astype('string').astype('category')
+        elif column in HIST_NUMERIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
+        else:
+            df[column] = df[column].astype('string')
+
+    return df.reset_index(drop=True)
+
+def parse_call(
+    option: str,
+    pdf_offert_file: Path,
+    pdf_result_file: Path=None,
+    participants: dict[str, list]=None,
+    workers: int=1,
+) -> pd.DataFrame:
+    """
+    PURPOSE:
+
+        Get every offerted place of a call (all codes and provinces) with its results if results pdf is given.
+        If participants table is given, it is filled with every candidate entry in results pdf.
+        Worker task, pdf pages are extracted serially by default since calls are already spread among processes
+
+    MANDATORY ARGUMENTS:
+
+        option: dificil or continua
+        pdf_offert_file: pdf file with place offerts
+    """
+    module = MODULES[option]
+    columns = module.DEFAULT_COLUMNS + module.EXTRA_COLUMNS
+
+    records = iter_pdf_matches(pdf_offert_file, module.OFFERT_CHECK_LINE, module.OFFERT_PATTERN, workers=workers)
+    df = offert_table_to_df(parse_offert_records(records, None), columns)
+
+    if pdf_result_file and (not df.empty or participants is not None):
+        # no candidate name, so 'you' column is meaningless and dropped
+        candidate = {'home': None, 'name': '', 'codes': df['code'].unique().tolist(), 'provinces': ALL_PROVINCES}
+
+        # participants of every code are wanted, so no section is skipped
+        records = iter_pdf_matches(pdf_result_file, module.RESULT_CHECK_LINE, module.RESULT_PATTERN, workers=workers,
+                                   candidate=candidate if participants is None else None)
+        if option == 'dificil':
+            df = parse_result_dificil_records(records, candidate, df, participants)
+        else:
+            df, _ = parse_result_continua_records(records, candidate, df, participants)
+
+    return to_history_dtypes(df)
+
+def partition_dir(dataset_dir: Path, option: str, date: str) -> Path:
+
+    return dataset_dir / f'option={option}' / f'date={date}'
+
+def pending_calls(calls: dict[str, dict[str, Path]], ingested: dict[str, dict]) -> dict[str, tuple[dict, dict]]:
+    # calls with offerts pdf whose pdfs are not the ones ingested, with digests of their pdfs
+
+    pending = {}
+    for key, call in calls.items():
+        if call['offert'] is None:
+            print(f' Warning: no offerts pdf for {key}, results pdf \'{call["result"]}\' is skipped')
+            continue
+
+        digests = {kind: file_digest(file) if file else None for kind, file in call.items()}
+        if ingested.get(key) != digests:
+            pending[key] = (call, digests)
+
+    return pending
+
+def iter_parsed_calls(
+    pending: dict[str, tuple[dict, dict]],
+    workers: int=INGEST_WORKERS,
+) -> Iterator[tuple[str, dict, pd.DataFrame]]:
+    # key, digests and places of every call as soon as it is parsed by process pool, calls that fail are reported and left out
+
+    if not pending:
+        return
+
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as executor:
+        futures = {executor.submit(parse_call, key.split('/')[0], call['offert'], call['result']): key
+                   for key, (call, _) in pending.items()}
+
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                df = future.result()
+            except (RuntimeError, ValueError) as error:
+                print(f' Warning: {key} not ingested, {error}')
+                continue
+
+            yield key, pending[key][1], df
+
+def ingest(pdf_dir: Path, dataset_dir: Path, workers: int=INGEST_WORKERS) -> int:
+    """
+    PURPOSE:
+
+        Parse calls in directory not ingested yet and write each of them as a partition of parquet dataset
+        (by option and date), calls are parsed in parallel by a process pool. Calls whose offerts and results pdfs
+        are already in manifest are skipped, calls with new results pdf are written again
+
+    MANDATORY ARGUMENTS:
+
+        pdf_dir: directory with pdfs
+        dataset_dir: directory of parquet dataset
+    """
+    require_pyarrow()
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(dataset_dir)
+    calls = find_calls(pdf_dir, manifest['files'])
+    store_manifest(dataset_dir, manifest)
+
+    pending = pending_calls(calls, {key: call['digests'] for key, call in manifest['calls'].items()})
+    print(f'{len(calls) - len(pending)} calls already ingested, {len(pending)} to ingest')
+
+    ingested = 0
+    for key, digests, df in iter_parsed_calls(pending, workers):
+        option, date = key.split('/')
+        out_dir = partition_dir(dataset_dir, option, date)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        with atomic_file(out_dir / 'part-0.parquet') as tmp_file:
+            df.to_parquet(tmp_file, index=False)
+
+        # manifest is updated after every call, so an interrupted ingest is resumed
+        manifest['calls'][key] = {'digests': digests, 'rows': len(df)}
+        store_manifest(dataset_dir, manifest)
+        ingested += 1
+        print(f' Ingested {key} ({len(df)} places)')
+
+    return ingested
+
+def load_history(dataset_dir: Path, option: str=None, codes: list[str]=None) -> pd.DataFrame:
+    """
+    PURPOSE:
+
+        Read historical dataset, with option and date columns from partitions.
+        Only partitions of option and rows of codes are read if given
+
+    MANDATORY ARGUMENTS:
+
+        dataset_dir: directory of parquet dataset
+    """
+    require_pyarrow()
+    filters = []
+    if option:
+        filters.append(('option', '=', option))
+    if codes:
+        filters.append(('code', 'in', list(codes)))
+
+    return pd.read_parquet(dataset_dir, filters=filters or None)
+
+def print_help():
+
+    print('')
+    print('Usage:')
+    print('=====')
+    print('')
+    print(' python histGV.py ingest /path/to/pdfs [/path/to/dataset]')
+    print(' python histGV.py summary /path/to/dataset')
+    print('')
+    print(' - ingest: parse every call in pdfs directory not ingested yet and add it to dataset')
+    print('   (\'history\' directory inside pdfs directory if not given). Offerts and results pdfs of a call')
+    print('   are told apart by their first page and paired by option and date in file name (e.g. 230929_pue_prov.pdf)')
+    print(' - summary: number of places by option and date in dataset')
+    print('')
+    print(' Parquet dataset needs pyarrow, install it with \'pip install pyarrow\'')
+    print('')
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ['ingest', 'summary'] or len(sys.argv) > (4 if sys.argv[1] == 'ingest' else 3):
+        print_help()
+        raise RuntimeError('Arguments are missing or incorrect')
+
+    if sys.argv[1] == 'ingest':
+        pdf_dir = Path(sys.argv[2])
+        dataset_dir = Path(sys.argv[3]) if len(sys.argv) == 4 else pdf_dir / 'history'
+        ingest(pdf_dir, dataset_dir)
+    else:
+        df = load_history(Path(sys.argv[2]))
+        print(df.groupby(['option', 'date'], observed=True).size().to_string())
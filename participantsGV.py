@@ -0,0 +1,86 @@
+import sys
+import time
+import pandas as pd
+
+import dificilGV
+import continuaGV
+from pathlib import Path
+from utilsGV import iter_pdf_matches, new_offert_table, offert_table_to_df, new_participant_table, participant_table_to_df, \
+    build_name_index, find_participant, parse_result_dificil_records, parse_result_continua_records, write_csv, \
+    EXTRACT_WORKERS
+
+
+MODULES = {'dificil': dificilGV, 'continua': continuaGV}
+
+
+def parse_participants(pdf_result_file: Path, option: str, workers: int=EXTRACT_WORKERS) -> pd.DataFrame:
+    """
+    PURPOSE:
+
+        Get every candidate entry in results pdf (all codes), with its place if it was assigned one.
+        Names are normalized as in is_name_match
+
+    MANDATORY ARGUMENTS:
+
+        pdf_result_file: pdf file with final results
+        option: dificil or continua
+    """
+    if not Path(pdf_result_file).exists():
+        raise FileNotFoundError(f'File \'{pdf_result_file}\' not found')
+
+    module = MODULES[option]
+    participants = new_participant_table()
+
+    # no offerts, so results are only collected in participant table
+    df = offert_table_to_df(new_offert_table(), module.DEFAULT_COLUMNS + module.EXTRA_COLUMNS)
+    candidate = {'name': '', 'codes': []}
+    records = iter_pdf_matches(pdf_result_file, module.RESULT_CHECK_LINE, module.RESULT_PATTERN, workers=workers)
+
+    if option == 'dificil':
+        parse_result_dificil_records(records, candidate, df, participants)
+    else:
+        parse_result_continua_records(records, candidate, df, participants)
+
+    return participant_table_to_df(participants)
+
+def print_help():
+
+    print('')
+    print('Usage:')
+    print('=====')
+    print('')
+    print(' python participantsGV.py dificil|continua /path/to/results.pdf name [name ...] [--csv /path/to/participants.csv]')
+    print('')
+    print(' - dificil|continua: option of pdf')
+    print(' - results.pdf: pdf file with final results')
+    print(' - name: surnames and then first name as in CANDIDATE (case and spaces are ignored)')
+    print(' - --csv: write every participant to csv file')
+    print('')
+
+if __name__ == '__main__':
+
+    args = sys.argv[1:]
+    csv_file = None
+    if '--csv' in args:
+        idx = args.index('--csv')
+        csv_file = Path(args[idx+1]) if idx + 1 < len(args) else None
+        args = args[:idx] + args[idx+2:]
+
+    if len(args) < 3 or args[0] not in MODULES or ('--csv' in sys.argv and csv_file is None):
+        print_help()
+        raise RuntimeError('Arguments are missing or incorrect')
+
+    participants = parse_participants(Path(args[1]), args[0])
+    index = build_name_index(participants)
+    print(f'{len(participants)} entries of {len(index)} participants')
+
+    for name in args[2:]:
+        start = time.perf_counter()
+        found = find_participant(participants, index, name)
+        elapsed = time.perf_counter() - start
+        print(f'{name} ({elapsed*1000:.3f} ms):')
+        print(found.to_string(index=False) if len(found) else ' Not found in results')
+
+    if csv_file:
+        write_csv(participants, csv_file)
+        print(f'See participants in \'{csv_file}\'')
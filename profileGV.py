@@ -0,0 +1,167 @@
+import sys
+import json
+import time
+import cProfile
+import threading
+import functools
+
+from pathlib import Path
+from contextlib import contextmanager, nullcontext
+from collections.abc import Callable, Iterator
+
+try:
+    import resource  # not available in Windows, peak RSS is left empty
+except ImportError:
+    resource = None
+
+
+class Profiler:
+    """
+    PURPOSE:
+
+        Wall and CPU time of every stage of a run, counters and peak RSS. Stages may be nested, e.g. extract
+        and geocode are spent inside offerts and results. If prof_dir is given, a cProfile dump of every
+        outermost stage is written to it
+
+    MANDATORY ARGUMENTS:
+
+        None
+    """
+
+    def __init__(self, prof_dir: Path=None):
+
+        self.prof_dir = Path(prof_dir) if prof_dir else None
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.profiling = False  # only one cProfile can be active at a time
+        self.start = time.perf_counter()
+
+    def add(self, name: str, wall: float, cpu: float) -> None:
+
+        with self.lock:
+            stage = self.stages.setdefault(name, {'wall_s': 0.0, 'cpu_s': 0.0, 'calls': 0})
+            stage['wall_s'] += wall
+            stage['cpu_s'] += cpu
+            stage['calls'] += 1
+
+    def count(self, name: str, n: int=1) -> None:
+
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def stage(self, name: str):
+
+        profile = None
+        if self.prof_dir and not self.profiling:
+            self.profiling = True
+            profile = cProfile.Profile()
+            profile.enable()
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.process_time() - cpu)
+            if profile:
+                profile.disable()
+                self.prof_dir.mkdir(parents=True, exist_ok=True)
+                profile.dump_stats(self.prof_dir / f'{name}.prof')
+                self.profiling = False
+
+    def timed(self, items: Iterator, name: str, counter: str=None) -> Iterator:
+        # time spent producing every item is added to stage, so lazy work is told apart from its consumer
+
+        items = iter(items)
+        while True:
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            finally:
+                self.add(name, time.perf_counter() - wall, time.thread_time() - cpu)
+            if counter:
+                self.count(counter)
+            yield item
+
+    def counted(self, items: Iterator, counter: str=None, key: Callable=None) -> Iterator:
+        # items are counted, and names given by key for every item
+
+        for item in items:
+            if counter:
+                self.count(counter)
+            if key:
+                for name in key(item):
+                    self.count(name)
+            yield item
+
+    def report(self) -> dict:
+
+        report = {
+            'wall_s': time.perf_counter() - self.start,
+            'stages': self.stages,
+            'counters': dict(sorted(self.counters.items())),
+            'peak_rss_mb': None,
+            'children_peak_rss_mb': None,
+        }
+
+        if resource is not None:
+            # ru_maxrss is in bytes in macOS and in kB elsewhere
+            scale = 1 / 2**20 if sys.platform == 'darwin' else 1 / 2**10
+            report['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, 1)
+            report['children_peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale, 1)
+
+        return report
+
+    def write(self, file: Path, **extra) -> None:
+
+        with open(file, 'w', encoding='utf-8') as f:
+            json.dump(dict(extra, **self.report()), f, indent=1, ensure_ascii=False)
+
+_profiler = None
+
+def enable_profiling(prof_dir: Path=None) -> Profiler:
+
+    global _profiler
+    _profiler = Profiler(prof_dir)
+    return _profiler
+
+def profiler() -> Profiler | None:
+
+    return _profiler
+
+def stage(name: str):
+    # context manager timing a stage, does nothing if profiling is not enabled
+
+    return _profiler.stage(name) if _profiler else nullcontext()
+
+def count(name: str, n: int=1) -> None:
+
+    if _profiler:
+        _profiler.count(name, n)
+
+def timed(name: str, counter: str=None):
+    # decorator of generator functions, time producing items is added to stage name if profiling is enabled
+
+    def decorator(foo):
+        @functools.wraps(foo)
+        def wrapper(*args, **kwargs):
+            items = foo(*args, **kwargs)
+            return _profiler.timed(items, name, counter) if _profiler else items
+        return wrapper
+
+    return decorator
+
+def counted(counter: str=None, key: Callable=None):
+    # decorator of generator functions, items yielded are counted if profiling is enabled
+
+    def decorator(foo):
+        @functools.wraps(foo)
+        def wrapper(*args, **kwargs):
+            items = foo(*args, **kwargs)
+            return _profiler.counted(items, counter, key) if _profiler else items
+        return wrapper
+
+    return decorator
@@ -0,0 +1,282 @@
+import os
+import sys
+import time
+import threading
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from geocodeGV import gazetteer, known_coordinates_of, geodesic_km, GAZETTEER_FILE
+from histGV import MODULES, find_calls, pending_calls, parse_call
+from utilsGV import city_coordinates, new_participant_table, participant_table_to_df, build_name_index, find_participant, \
+    CSV_SEPARATOR, EXTRACT_WORKERS
+
+
+SERVE_HOST = os.environ.get('INTERIGV_SERVE_HOST', '127.0.0.1')
+SERVE_PORT = int(os.environ.get('INTERIGV_SERVE_PORT', 8731))
+SERVE_POLL = float(os.environ.get('INTERIGV_SERVE_POLL', 5))  # seconds between scans of watched directory
+
+
+def load_call(option: str, pdf_offert_file: Path, pdf_result_file: Path=None, workers: int=EXTRACT_WORKERS) -> dict:
+    """
+    PURPOSE:
+
+        Parse a call once for every query: offerts of all codes and provinces with coordinates of their cities
+        (offline, from gazetteer and geocode cache only) and participant table of results indexed by name
+
+    MANDATORY ARGUMENTS:
+
+        option: dificil or continua
+        pdf_offert_file: pdf file with place offerts
+    """
+    participants = new_participant_table() if pdf_result_file else None
+    df = parse_call(option, pdf_offert_file, pdf_result_file, participants, workers=workers)
+    latitude, longitude = city_coordinates(df, offline=True) if not df.empty else (np.array([]), np.array([]))
+    participants = participant_table_to_df(participants) if participants is not None else None
+
+    return {
+        'option': option,
+        'offert': str(pdf_offert_file),
+        'result': str(pdf_result_file) if pdf_result_file else None,
+        'df': df,
+        'latitude': latitude,
+        'longitude': longitude,
+        'participants': participants,
+        'names': build_name_index(participants) if participants is not None else None,
+    }
+
+def query_offerts(call: dict, params: dict[str, str]) -> pd.DataFrame:
+    """
+    PURPOSE:
+
+        Offerts of call filtered by codes, provinces and distance to home, with position of name in results
+
+    MANDATORY ARGUMENTS:
+
+        call: call as in load_call
+        params: query parameters (codes, provinces, home, max_km, name), codes and provinces are comma separated
+    """
+    module = MODULES[call['option']]
+    df = call['df']
+    mask = np.ones(len(df), dtype=bool)
+
+    if params.get('codes'):
+        mask &= df['code'].isin(params['codes'].split(',')).to_numpy()
+    if params.get('provinces'):
+        mask &= df['province'].isin(params['provinces'].upper().split(',')).to_numpy()
+
+    distance = np.full(len(df), np.nan)
+    if params.get('home'):
+        home = known_coordinates_of(params['home'])
+        if home is None:
+            raise ValueError(f'Town \'{params["home"]}\' is not in gazetteer or geocode cache')
+        distance[mask] = np.round(geodesic_km(*home, call['latitude'][mask], call['longitude'][mask]))
+
+    if params.get('max_km'):
+        if not params.get('home'):
+            raise ValueError('max_km needs home')
+        mask &= distance <= float(params['max_km'])
+
+    result = df[mask].reset_index(drop=True)
+    result['distance_km'] = pd.array(distance[mask], dtype='Int64') if params.get('home') else pd.NA
+    result['you'] = pd.NA
+
+    if params.get('name') and call['participants'] is not None:
+        entries = find_participant(call['participants'], call['names'], params['name'])
+        if call['option'] == 'continua':
+            entries = entries[entries['assigned']].assign(position='YES')
+        you = {key: position for key, position in
+               zip(zip(entries['code'], entries['school_id'], entries['city_id']), entries['position'])}
+        result['you'] = [you.get(key, pd.NA) for key in zip(result['code'], result['school_id'], result['city_id'])]
+
+    columns = module.DEFAULT_COLUMNS + (module.EXTRA_COLUMNS if call['result'] else [])
+    return result.reindex(columns=columns)
+
+def query_participants(call: dict, params: dict[str, str]) -> pd.DataFrame:
+    # entries of name in results of call, of codes if given
+
+    if call['participants'] is None or not params.get('name'):
+        raise ValueError('participants need a call with results and name')
+
+    entries = find_participant(call['participants'], call['names'], params['name'])
+    if params.get('codes'):
+        entries = entries[entries['code'].isin(params['codes'].split(','))]
+
+    return entries.reset_index(drop=True)
+
+class CallStore:
+    """
+    PURPOSE:
+
+        Parsed calls of a watched directory kept in memory. Directory is scanned in background and new or changed
+        calls are parsed and swapped in, so queries always see complete calls
+
+    MANDATORY ARGUMENTS:
+
+        pdf_dir: watched directory with pdfs
+    """
+
+    def __init__(self, pdf_dir: Path, poll: float=SERVE_POLL):
+
+        self.pdf_dir = Path(pdf_dir)
+        self.poll = poll
+        self.files = {}  # option and kind by pdf digest, as needed by find_calls
+        self.digests = {}  # digests of pdfs of every loaded call
+        self.calls = {}
+        self.signature = None
+        self.lock = threading.Lock()
+
+    def scan(self) -> int:
+        # load calls new or changed since last scan, pdfs are only hashed when some file in directory changed
+
+        signature = sorted((str(file), file.stat().st_mtime_ns, file.stat().st_size) for file in self.pdf_dir.rglob('*.pdf'))
+        if signature == self.signature:
+            return 0
+        self.signature = signature
+
+        calls = find_calls(self.pdf_dir, self.files)
+        pending = pending_calls(calls, self.digests)
+
+        loaded = 0
+        for key, (call, digests) in pending.items():
+            start = time.perf_counter()
+            try:
+                parsed = load_call(key.split('/')[0], call['offert'], call['result'])
+            except Exception as error:
+                # any failure of a pdf (pdftotext, check line, duplicate places) only leaves out its call
+                print(f' Warning: {key} not loaded, {type(error).__name__}: {error}')
+                continue
+
+            # a new dict is swapped in, so queries running keep the calls they started with
+            with self.lock:
+                self.calls = dict(self.calls, **{key: parsed})
+                self.digests[key] = digests
+            loaded += 1
+            print(f' Loaded {key} ({len(parsed["df"])} places) in {time.perf_counter() - start:.1f} s')
+
+        return loaded
+
+    def watch(self) -> None:
+
+        while True:
+            time.sleep(self.poll)
+            # watcher thread must outlive any failed scan, or calls would silently stop being reloaded
+            try:
+                self.scan()
+            except Exception as error:
+                print(f' Warning: scan of \'{self.pdf_dir}\' failed, {type(error).__name__}: {error}')
+
+    def get(self, option: str=None, date: str=None) -> tuple[str, dict]:
+        # call of option and date, latest call of option if date is not given
+
+        calls = self.calls
+        keys = sorted(key for key in calls if (option is None or key.startswith(f'{option}/')) and (date is None or key.endswith(f'/{date}')))
+        if not keys:
+            raise KeyError(f'No call loaded for option {option or "any"} and date {date or "any"}')
+
+        return keys[-1], calls[keys[-1]]
+
+class QueryHandler(BaseHTTPRequestHandler):
+    # GET /calls, /offerts and /participants, responses are json or csv (format=csv)
+
+    store = None
+
+    def do_GET(self):
+
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        option, date = params.get('option'), params.get('date')
+
+        try:
+            if url.path == '/calls':
+                calls = self.store.calls
+                df = pd.DataFrame([{'call': key, 'places': len(call['df']), 'results': call['result'] is not None}
+                                   for key, call in sorted(calls.items())], columns=['call', 'places', 'results'])
+            elif url.path == '/offerts':
+                _, call = self.store.get(option, date)
+                df = query_offerts(call, params)
+            elif url.path == '/participants':
+                _, call = self.store.get(option, date)
+                df = query_participants(call, params)
+            else:
+                return self.send_body(404, 'text/plain', f'Unknown path {url.path}')
+        except KeyError as error:
+            return self.send_body(404, 'text/plain', str(error.args[0]))
+        except ValueError as error:
+            return self.send_body(400, 'text/plain', str(error))
+
+        if params.get('format') == 'csv':
+            self.send_body(200, 'text/csv', df.to_csv(sep=CSV_SEPARATOR, index=False))
+        else:
+            self.send_body(200, 'application/json', df.to_json(orient='records', force_ascii=False))
+
+    def send_body(self, status: int, content_type: str, body: str) -> None:
+
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # queries are not logged, they are too many
+
+        pass
+
+def serve(pdf_dir: Path, host: str=SERVE_HOST, port: int=SERVE_PORT) -> None:
+    """
+    PURPOSE:
+
+        Load calls in directory and answer queries until interrupted, directory is watched for new pdfs.
+        Towns are never geocoded by the server, so it does not start without gazetteer
+
+    MANDATORY ARGUMENTS:
+
+        pdf_dir: watched directory with pdfs
+    """
+    if len(gazetteer()) == 0:
+        raise RuntimeError(f'Gazetteer \'{GAZETTEER_FILE}\' is empty or missing, distances could not be computed')
+
+    store = CallStore(pdf_dir)
+    store.scan()
+    threading.Thread(target=store.watch, daemon=True).start()
+
+    handler = type('Handler', (QueryHandler,), {'store': store})
+    with ThreadingHTTPServer((host, port), handler) as server:
+        print(f'Serving {len(store.calls)} calls on http://{host}:{port}, watching \'{pdf_dir}\'')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+def print_help():
+
+    print('')
+    print('Usage:')
+    print('=====')
+    print('')
+    print(' python serveGV.py /path/to/pdfs [port]')
+    print('')
+    print(' - pdfs: directory with offerts and results pdfs, paired as in histGV.py and reloaded when they change')
+    print(' - port: port on localhost (INTERIGV_SERVE_PORT or 8731 by default)')
+    print('')
+    print(' Queries:')
+    print('')
+    print(' - /calls: loaded calls')
+    print(' - /offerts?option=continua&codes=206,207&provinces=VALENCIA&home=Alcoi&max_km=40&name=Surname1 Surname2 Name')
+    print(' - /participants?option=dificil&name=Surname1 Surname2 Name')
+    print('')
+    print(' Latest call of option is used unless date=yyyy-mm-dd is given, add format=csv to get csv instead of json.')
+    print(' Towns and cities are only looked up in gazetteer and geocode cache, distance is left empty if not found')
+    print('')
+
+if __name__ == '__main__':
+
+    if len(sys.argv) not in [2, 3] or (len(sys.argv) == 3 and not sys.argv[2].isdigit()):
+        print_help()
+        raise RuntimeError('Arguments are missing or incorrect')
+
+    serve(Path(sys.argv[1]), port=int(sys.argv[2]) if len(sys.argv) == 3 else SERVE_PORT)
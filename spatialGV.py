@@ -0,0 +1,245 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from geocodeGV import coordinates_of, geodesic_km
+from utilsGV import city_coordinates, CSV_SEPARATOR
+
+
+GRID_CELL_KM = 10
+EARTH_RADIUS_KM = 6371.0088
+PROJECTION_MARGIN = 1.05  # grid distances are within 5% of geodesic ones inside the Comunitat Valenciana
+
+
+class SpatialIndex:
+    """
+    PURPOSE:
+
+        Grid of points on lat/lon, points are bucketed by cells of an equirectangular projection and
+        geodesic distance is only computed for points in cells near the query
+
+    MANDATORY ARGUMENTS:
+
+        latitude: latitude of points, NaN points are left out
+        longitude: longitude of points
+    """
+
+    def __init__(self, latitude: np.ndarray, longitude: np.ndarray, cell_km: float=GRID_CELL_KM):
+
+        self.latitude = np.asarray(latitude, dtype=float)
+        self.longitude = np.asarray(longitude, dtype=float)
+        self.cell_km = cell_km
+        known = np.flatnonzero(~np.isnan(self.latitude) & ~np.isnan(self.longitude))
+        self.size = len(known)
+        self.cos_lat0 = np.cos(np.radians(self.latitude[known].mean())) if len(known) else 1.0
+
+        cx, cy = self.cell_of(self.latitude[known], self.longitude[known])
+        order = np.lexsort((cy, cx))
+        keys = np.stack([cx[order], cy[order]], axis=1)
+        starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)]) if len(keys) else np.array([], dtype=int)
+        self.cells = {(int(keys[start, 0]), int(keys[start, 1])): known[order[start:end]]
+                      for start, end in zip(starts, np.r_[starts[1:], len(keys)])}
+
+    def cell_of(self, latitude, longitude) -> tuple[np.ndarray]:
+
+        x = np.radians(longitude) * EARTH_RADIUS_KM * self.cos_lat0
+        y = np.radians(latitude) * EARTH_RADIUS_KM
+        return np.floor(x / self.cell_km).astype(int), np.floor(y / self.cell_km).astype(int)
+
+    def candidates(self, cx: int, cy: int, ring: int, inner: int=-1) -> np.ndarray:
+        # points in cells at Chebyshev distance from (cx, cy) above inner and up to ring
+
+        if (2*ring + 1)**2 > len(self.cells):
+            # more cells in ring than in grid, so look at every cell instead
+            found = [points for (x, y), points in self.cells.items() if inner < max(abs(x - cx), abs(y - cy)) <= ring]
+        else:
+            found = [self.cells[(x, y)] for x in range(cx - ring, cx + ring + 1) for y in range(cy - ring, cy + ring + 1)
+                     if max(abs(x - cx), abs(y - cy)) > inner and (x, y) in self.cells]
+
+        return np.concatenate(found) if found else np.array([], dtype=int)
+
+    def within(self, latitude: float, longitude: float, radius_km: float) -> tuple[np.ndarray]:
+        # points within radius, sorted by distance, and their distances
+
+        cx, cy = self.cell_of(latitude, longitude)
+        idx = self.candidates(int(cx), int(cy), int(np.ceil(radius_km * PROJECTION_MARGIN / self.cell_km)))
+        distance = geodesic_km(latitude, longitude, self.latitude[idx], self.longitude[idx])
+        keep = distance <= radius_km
+        order = np.argsort(distance[keep], kind='stable')
+
+        return idx[keep][order], distance[keep][order]
+
+    def nearest(self, latitude: float, longitude: float, k: int) -> tuple[np.ndarray]:
+        # k nearest points sorted by distance, and their distances. Rings of cells are added until
+        # no point out of them can be closer than the k-th one
+
+        cx, cy = self.cell_of(latitude, longitude)
+        cx, cy = int(cx), int(cy)
+        idx, distance = np.array([], dtype=int), np.array([])
+        inner, ring, seen = -1, 0, 0
+
+        while seen < self.size:
+            new = self.candidates(cx, cy, ring, inner)
+            seen += len(new)
+            idx = np.r_[idx, new]
+            distance = np.r_[distance, geodesic_km(latitude, longitude, self.latitude[new], self.longitude[new])]
+
+            # points out of ring are further than ring cells away, so once k points are found
+            # only rings up to the k-th distance are left
+            if len(idx) >= k:
+                reach = int(np.ceil(np.partition(distance, k - 1)[k - 1] * PROJECTION_MARGIN / self.cell_km))
+                if reach <= ring:
+                    break
+                inner, ring = ring, reach
+            else:
+                inner, ring = ring, max(1, 2*ring)
+
+        order = np.argsort(distance, kind='stable')[:k]
+        return idx[order], distance[order]
+
+class OffertIndex:
+    """
+    PURPOSE:
+
+        Spatial index of offerts, cities of offerts are geocoded once and indexed, so queries only compute
+        distances for a few cities near the query point
+
+    MANDATORY ARGUMENTS:
+
+        df: offerts as in summary, with city and city_id columns
+    """
+
+    def __init__(self, df: pd.DataFrame, cell_km: float=GRID_CELL_KM):
+
+        self.df = df.reset_index(drop=True)
+        keys = list(zip(self.df['city'], self.df['city_id']))
+        position = {city: idx for idx, city in enumerate(dict.fromkeys(keys))}
+
+        # rows of every city, cities are the indexed points
+        city_of_row = np.array([position[key] for key in keys], dtype=int)
+        order = np.argsort(city_of_row, kind='stable')
+        self.rows = np.split(order, np.flatnonzero(np.diff(city_of_row[order])) + 1) if len(order) else []
+
+        latitude, longitude = city_coordinates(pd.DataFrame(list(position), columns=['city', 'city_id']))
+        self.index = SpatialIndex(latitude, longitude, cell_km)
+
+        self.codes = self.df['code'].to_numpy(dtype=object)
+        self.schools = pd.factorize(self.df['school_id'])[0]
+        self.code_masks = {}
+
+    def select(self, city_idx: np.ndarray, distance: np.ndarray, codes: list[str]=None) -> tuple[np.ndarray]:
+        # rows of cities and their distance, only for codes if given
+
+        rows = [self.rows[idx] for idx in city_idx]
+        row_distance = np.repeat(distance, [len(row) for row in rows])
+        rows = np.concatenate(rows) if rows else np.array([], dtype=int)
+
+        if codes:
+            key = tuple(codes)
+            if key not in self.code_masks:
+                self.code_masks[key] = np.isin(self.codes, codes)
+            keep = self.code_masks[key][rows]
+            rows, row_distance = rows[keep], row_distance[keep]
+
+        return rows, row_distance
+
+    def within(self, towns: list[str], radius_km: float, codes: list[str]=None) -> tuple[np.ndarray]:
+        """
+        PURPOSE:
+
+            Get rows of offerts within radius of any town and their distance to closest town, sorted by distance
+
+        MANDATORY ARGUMENTS:
+
+            towns: town names
+            radius_km: radius in km
+        """
+        best = {}
+        for town in towns:
+            for idx, distance in zip(*self.index.within(*coordinates_of(town), radius_km)):
+                best[idx] = min(distance, best.get(idx, distance))
+
+        city_idx = np.array(sorted(best, key=best.get), dtype=int)
+        return self.select(city_idx, np.array([best[idx] for idx in city_idx]), codes)
+
+    def nearest(self, town: str, k: int, codes: list[str]=None) -> tuple[np.ndarray]:
+        """
+        PURPOSE:
+
+            Get rows of offerts of the k nearest schools to town and their distance, sorted by distance
+
+        MANDATORY ARGUMENTS:
+
+            town: town name
+            k: number of schools
+        """
+        latitude, longitude = coordinates_of(town)
+        size = k
+
+        # nearest cities are taken until they have k schools with offerts of codes
+        while True:
+            rows, distance = self.select(*self.index.nearest(latitude, longitude, size), codes)
+            _, first = np.unique(self.schools[rows], return_index=True)
+            if len(first) >= k or size >= self.index.size:
+                break
+            size *= 2
+
+        schools = self.schools[rows[np.sort(first)[:k]]]
+        keep = np.isin(self.schools[rows], schools)
+        return rows[keep], distance[keep]
+
+    def to_df(self, rows: np.ndarray, distance: np.ndarray) -> pd.DataFrame:
+        # offerts of rows with distance in km
+
+        df = self.df.iloc[rows].copy()
+        df['distance_km'] = np.round(distance, 1)
+        return df
+
+def load_offerts(csv_file: Path) -> pd.DataFrame:
+
+    return pd.read_csv(csv_file, sep=CSV_SEPARATOR, dtype=str, keep_default_na=False).replace('', None)
+
+def print_offerts(df: pd.DataFrame, elapsed: float) -> None:
+
+    columns = [column for column in ['distance_km', 'code', 'city', 'school_name', 'school_id', 'type'] if column in df]
+    print(df[columns].to_string(index=False) if len(df) else 'No offerts found')
+    print(f'{len(df)} offerts in {elapsed*1000:.2f} ms')
+
+def print_help():
+
+    print('')
+    print('Usage:')
+    print('=====')
+    print('')
+    print(' python spatialGV.py within /path/to/summary.csv radius_km town [town ...] [--codes 206,207]')
+    print(' python spatialGV.py nearest /path/to/summary.csv k town [--codes 206,207]')
+    print('')
+    print(' - within: offerts within radius_km of any town')
+    print(' - nearest: offerts of the k nearest schools to town')
+    print(' - summary.csv: summary written by dificilGV.py, continuaGV.py or batchGV.py')
+    print('')
+
+if __name__ == '__main__':
+
+    args = sys.argv[1:]
+    codes = None
+    if '--codes' in args:
+        idx = args.index('--codes')
+        codes = args[idx+1].split(',') if idx + 1 < len(args) else None
+        args = args[:idx] + args[idx+2:]
+
+    if len(args) < 4 or args[0] not in ['within', 'nearest'] or (args[0] == 'nearest' and len(args) != 4) or codes == []:
+        print_help()
+        raise RuntimeError('Arguments are missing or incorrect')
+
+    index = OffertIndex(load_offerts(Path(args[1])))
+
+    start = time.perf_counter()
+    if args[0] == 'within':
+        rows, distance = index.within(args[3:], float(args[2]), codes)
+    else:
+        rows, distance = index.nearest(args[3], int(args[2]), codes)
+
+    print_offerts(index.to_df(rows, distance), time.perf_counter() - start)
@@ -1,34 +1,580 @@
+from __future__ import annotations
+
+import os
 import re
 import sys
-import pdftotext  # 2.1.6 must be used, pdftotext > 2.1.6 has undesired result
-import pandas as pd
-
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
+import csv
+import json
+import weakref
+import threading
+import importlib.util
+import multiprocessing
+import numpy as np
+
+from queue import Queue, Full
+from typing import TYPE_CHECKING
+from bisect import bisect_right
 from pathlib import Path
+from collections import deque
+from contextlib import contextmanager
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from profileGV import enable_profiling, profiler, stage, count, timed, counted
+from geocodeGV import coordinates_of, known_coordinates_of, gazetteer, geodesic_km, resolve_cities
+from cacheGV import iter_cached_pages, iter_cached_page_range, has_cached_pages, records_file, load_object, store_object, \
+    load_records, store_records, load_section_records, store_section_records
+
+# pandas and pdftotext are imported where they are used, so summaries are written without loading pandas
+# and cached pdfs are read without loading pdftotext (2.1.6 must be used, pdftotext > 2.1.6 has undesired result)
+if TYPE_CHECKING:
+    import pandas as pd
 
-
-DEFAULT_TIMEOUT = 10
 IS_WINDOWS = sys.platform.startswith('win') == 'Windows'
 CSV_SEPARATOR = ';' if IS_WINDOWS is True else ','
+ALL_PROVINCES = ['ALACANT', 'CASTELLÓ', 'VALÈNCIA', 'ALICANTE', 'CASTELLÓN', 'VALENCIA']  # valencian and castilian names
 SPECIAL_ALPHA_CHARS = ' \(\)A-ZÁÉÍÓÚÀÈÌÒÙÇÜÏÑ\'.-'
 SPECIAL_ALPHANUMERIC_CHARS = SPECIAL_ALPHA_CHARS + '0-9'
+OFFERT_FIELDS = ['code', 'subject', 'province', 'city', 'city_id', 'distance_km',
+                 'school_name', 'school_id', 'hours', 'language', 'itinerant', 'type']
+CATEGORICAL_COLUMNS = ['province', 'subject', 'type']
+PARTICIPANT_FIELDS = ['code', 'school_id', 'city_id', 'position', 'name', 'group', 'assigned']
+EXTRACT_WORKERS = int(os.environ.get('INTERIGV_EXTRACT_WORKERS', os.cpu_count() or 1))
+EXTRACT_CHUNK_PAGES = 25  # pages extracted by each worker task
+PREFETCH_POLL_SECONDS = 0.1  # a waiting prefetch thread checks this often if its consumer is gone
+# pools are started from prefetch and server threads too, and forking a process with threads may deadlock
+EXTRACT_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+CHECKPOINT_SECTIONS = 50  # sections in each cache file of section records
+PDF_CACHE = os.environ.get('INTERIGV_PDF_CACHE', '1') != '0'
+SECTION_PATTERNS = ['code', 'province']  # a line matching any of these starts a new section
+SPLIT_ENTRY_START = re.compile(r'^\d+ +(-->)? *[A-ZÁÉÍÓÚÀÈÌÒÙÇÜÏÑ]')  # start of candidate entry in results
+NAME_CONTINUATION = re.compile(f'^ +[A-ZÁÉÍÓÚÀÈÌÒÙÇÜÏÑ][{SPECIAL_ALPHA_CHARS}]*$')  # rest of a long name alone in a line
+# types of result columns as cast in dataframes (float, Int64 and str), kept by csv written from offert tables
+RESULT_COLUMN_TYPES = {
+    'dificil': {'winner': float, 'you': float, 'total': float, 'groups': str},
+    'continua': {'winner': int, 'you': float},
+}
+# fields of result entries of candidate codes kept by result parsers for statistics, and columns of statistics
+STATS_ENTRY_FIELDS = {
+    'dificil': ['code', 'subject', 'place', 'position', 'group', 'assigned', 'you'],
+    'continua': ['code', 'subject', 'position', 'you', 'result', 'type'],
+}
+STATS_COLUMNS = ['code', 'subject', 'stat', 'label', 'value']
+STATS_GROUPS = ['1', '2', '3']
+
+def extract_pages(pdf_file: Path, first: int, last: int) -> list[str]:
+    # worker task, each process opens its own document since pdftotext.PDF cannot be pickled
+    import pdftotext
 
-def pdf2str(pdf_file: Path) -> str:
+    with open(pdf_file, 'rb') as f:
+        pdf = pdftotext.PDF(f)  # pdftotext > 2.1.6 has undesired result
+    return [pdf[page] for page in range(first, min(last, len(pdf)))]
+
+@timed('extract', counter='pages')
+def iter_pages(pdf_file: Path, workers: int=EXTRACT_WORKERS, start: int=0) -> Iterator[str]:
     """
     PURPOSE:
 
-        Convert pdf to text
+        Yield page texts of pdf in order from page start, page ranges of large pdfs are split among a process pool
+        and only a few ranges are extracted ahead of the page being yielded
 
     MANDATORY ARGUMENTS:
 
         None
     """
+    import pdftotext
+
     with open(pdf_file, 'rb') as f:
         pdf = pdftotext.PDF(f)  # pdftotext > 2.1.6 has undesired result
+
+    if workers <= 1 or len(pdf) - start <= 2*EXTRACT_CHUNK_PAGES:
+        yield from (pdf[page] for page in range(start, len(pdf)))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(EXTRACT_START_METHOD)) as executor:
+        pending = deque()
+        for first in range(start, len(pdf), EXTRACT_CHUNK_PAGES):
+            pending.append(executor.submit(extract_pages, pdf_file, first, first + EXTRACT_CHUNK_PAGES))
+            if len(pending) > workers:
+                yield from pending.popleft().result()
+
+        while pending:
+            yield from pending.popleft().result()
+
+def pdf2pages(pdf_file: Path, workers: int=EXTRACT_WORKERS) -> list[str]:
+    """
+    PURPOSE:
+
+        Convert pdf to list of page texts
+
+    MANDATORY ARGUMENTS:
+
+        None
+    """
+    return list(iter_pages(pdf_file, workers))
+
+def pdf2str(pdf_file: Path, workers: int=EXTRACT_WORKERS) -> str:
+    """
+    PURPOSE:
+
+        Convert pdf to text
+
+    MANDATORY ARGUMENTS:
+
+        None
+    """
     # read all the text into one string
     # '\n\n' to separate pages in text
-    return "\n\n".join(pdf)
+    return "\n\n".join(pdf2pages(pdf_file, workers))
+
+def prefetch(items: Iterator, size: int=EXTRACT_CHUNK_PAGES) -> Iterator:
+    # consume items in a background thread started right away, at most size items are kept waiting.
+    # Thread stops and closes items when returned iterator is closed, raises or is garbage collected
+
+    queue = Queue(maxsize=size)
+    done = object()
+    stop = threading.Event()
+
+    def put(entry: tuple) -> bool:
+        # False if consumer is gone
+        while not stop.is_set():
+            try:
+                queue.put(entry, timeout=PREFETCH_POLL_SECONDS)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    break
+            else:
+                put((done, None))
+        except Exception as error:
+            put((None, error))
+        finally:
+            if hasattr(items, 'close'):
+                items.close()
+
+    def consume() -> Iterator:
+        try:
+            while True:
+                item, error = queue.get()
+                if error:
+                    raise error
+                if item is done:
+                    return
+                yield item
+        finally:
+            stop.set()
+
+    threading.Thread(target=produce, daemon=True).start()
+    consumer = consume()
+    weakref.finalize(consumer, stop.set)  # a consumer never started runs no finally
+    return consumer
+
+@counted('lines')
+def iter_pdf_lines(
+    file: Path,
+    check_line: dict[str, str | int],
+    pages: Iterator[str]=None,
+    debug: bool=False,
+    workers: int=EXTRACT_WORKERS,
+) -> Iterator[str]:
+    """
+    PURPOSE:
+
+        Yield lines of pdf page by page, same lines as splitting the whole text with pages joined by '\\n\\n'.
+        Format is checked on first page and in debug mode text is dumped to a txt file as pages are read
+
+    MANDATORY ARGUMENTS:
+
+        file: pdf file
+        check_line: line index and text to check on first page
+    """
+    pages = iter_pages(file, workers) if pages is None else pages
+    number, txt = None, None
+
+    try:
+        for number, page in enumerate(pages):
+            lines = page.split('\n')
+
+            if number == 0:
+                # check that this is the pdf
+                if not lines[check_line['idx']].strip().startswith(check_line['text']):
+                    raise RuntimeError(f'Wrong format for file \'{file}\'')
+
+                if debug is True:
+                    txt = open(file.with_suffix('.txt'), 'w')
+            else:
+                yield ''
+
+            if txt:
+                txt.write(f'{page}' if number == 0 else f'\n\n{page}')
+
+            yield from lines
+
+        if number is None:
+            raise RuntimeError(f'Wrong format for file \'{file}\'')
+
+    finally:
+        if txt:
+            txt.close()
+
+def closing_paren(source: str, start: int) -> int:
+    # index of parenthesis closing the one at start, escapes and character classes are skipped
+
+    depth, idx, in_class = 0, start, False
+    while idx < len(source):
+        char = source[idx]
+        if char == '\\':
+            idx += 1
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return idx
+        idx += 1
+
+    return len(source)
+
+def line_guard(regex: re.Pattern) -> tuple[bool, str, bool] | None:
+    """
+    PURPOSE:
+
+        Get a cheap necessary condition for regex to match a line, read from the start of its source:
+        (leading spaces required, literal text after leading spaces, digit after leading spaces and literal).
+        None if regex is not anchored with '^' or its start cannot be told
+
+    MANDATORY ARGUMENTS:
+
+        regex: compiled pattern
+    """
+    source = regex.pattern
+    if not source.startswith('^') or regex.flags & re.IGNORECASE:
+        return None
+
+    spaces = re.match(r'( +)([+*?{]?)', source[1:])
+    if spaces and spaces[2] not in ['', '+']:
+        return None
+    rest = source[1 + spaces.end():] if spaces else source[1:]
+
+    idx = 0
+    while idx < len(rest) and rest[idx] not in '\\.^$*+?{}[]|()':
+        idx += 1
+    literal = rest[:idx]
+    if literal and idx < len(rest) and rest[idx] in '*+?{':
+        literal = literal[:-1]  # last char is quantified
+
+    digit = False
+    if not literal:
+        # \d, maybe as first thing of a named group that is not optional
+        group = re.match(r'\(\?P<\w+>', rest)
+        first = rest[group.end():] if group else rest
+        end = closing_paren(rest, 0) + 1 if group else 2
+        digit = first.startswith('\\d') and first[2:3] not in ['*', '?', '{'] and rest[end:end+1] not in ['*', '?', '{']
+
+    if not spaces and not literal and not digit:
+        return None
+
+    return (bool(spaces), literal, digit)
+
+def iter_matches(lines: Iterator[str], pattern: dict[str, re.Pattern]) -> Iterator[dict[str, dict]]:
+    # matched groups of every pattern, lines that match no pattern are dropped
+
+    for _, matches in iter_numbered_matches(lines, pattern):
+        yield matches
+
+@counted(key=lambda item: [f'matches_{name}' for name in item[1]])
+def iter_numbered_matches(lines: Iterator[str], pattern: dict[str, re.Pattern]) -> Iterator[tuple[int, dict[str, dict]]]:
+    # line number and matched groups of every pattern, lines that match no pattern are dropped.
+    # Candidate entries split in two lines are joined first
+
+    if 'candidate' in pattern:
+        yield from join_split_entries(iter_classified_lines(lines, pattern, every=True), pattern['candidate'])
+        return
+
+    for number, _, matches in iter_classified_lines(lines, pattern):
+        yield number, matches
+
+def iter_classified_lines(
+    lines: Iterator[str],
+    pattern: dict[str, re.Pattern],
+    every: bool=False,
+) -> Iterator[tuple[int, str, dict[str, dict]]]:
+    # line number, line and matched groups of every pattern, lines that match no pattern are dropped unless every is True.
+    # Line start is checked against guards first, so most lines go through one full regex only
+
+    spaced, plain, unguarded = [], [], []
+    for name, regex in pattern.items():
+        guard = line_guard(regex)
+        if guard is None:
+            unguarded.append((name, regex.search))
+        else:
+            (spaced if guard[0] else plain).append((name, regex.match, guard[1], guard[2]))
+
+    for number, line in enumerate(lines):
+        matches = {}
+
+        if line[:1] == ' ':
+            stripped = line.lstrip(' ')
+            for name, match_foo, literal, digit in spaced:
+                if stripped.startswith(literal) and (not digit or stripped[:1].isdigit()):
+                    match = match_foo(line)
+                    if match:
+                        matches[name] = match.groupdict()
+        else:
+            for name, match_foo, literal, digit in plain:
+                if line.startswith(literal) and (not digit or line[:1].isdigit()):
+                    match = match_foo(line)
+                    if match:
+                        matches[name] = match.groupdict()
+
+        for name, search_foo in unguarded:
+            match = search_foo(line)
+            if match:
+                matches[name] = match.groupdict()
+
+        if matches or every:
+            yield number, line, matches
+
+def join_split_entry(first: str, second: str, regex: re.Pattern) -> re.Match | None:
+    # match of an entry whose name is split in two lines, with rest of name in second line
+    # either appended to first line or put after the part of name in first line
+
+    rest = second.strip()
+    if not rest or not NAME_CONTINUATION.match(second):
+        return None
+
+    name_end = first.find('  ', SPLIT_ENTRY_START.match(first).end())
+    joined = [f'{first.rstrip()} {rest}'] + ([f'{first[:name_end]} {rest}{first[name_end:]}'] if name_end > 0 else [])
+
+    for line in joined:
+        match = regex.match(line)
+        if match:
+            return match
+
+    return None
+
+def join_split_entries(
+    classified: Iterator[tuple[int, str, dict[str, dict]]],
+    regex: re.Pattern,
+) -> Iterator[tuple[int, dict[str, dict]]]:
+    """
+    PURPOSE:
+
+        Yield line number and matched groups of every pattern, lines that match no pattern are dropped.
+        Candidate entries with long first names are split in two lines, with rest of name alone in the next line.
+        So the line after every entry is looked at: if it is only a name, it is added to name of entry, and if
+        entry did not match, entry is matched again joined with it
+
+    MANDATORY ARGUMENTS:
+
+        classified: line number, line and matched groups of every line
+        regex: candidate pattern
+    """
+    held = None  # entry waiting for next line
+
+    for number, line, matches in classified:
+
+        if held is not None:
+            held_number, held_line, held_matches = held
+            held = None
+
+            if 'candidate' in held_matches:
+                if not matches and NAME_CONTINUATION.match(line):
+                    candidate = dict(held_matches['candidate'])
+                    candidate['name'] = f'{candidate["name"].rstrip()} {line.strip()}'
+                    yield held_number, dict(held_matches, candidate=candidate)
+                    continue
+                yield held_number, held_matches
+            else:
+                match = join_split_entry(held_line, line, regex) if not matches else None
+                if match:
+                    yield held_number, dict(held_matches, candidate=match.groupdict())
+                    continue
+                if held_matches:
+                    yield held_number, held_matches
+
+        if 'candidate' in matches or (line[:1].isdigit() and SPLIT_ENTRY_START.match(line)):
+            held = (number, line, matches)
+        elif matches:
+            yield number, matches
+
+    if held is not None and held[2]:
+        yield held[0], held[2]
+
+def index_sections(
+    file: Path,
+    check_line: dict[str, str | int],
+    pattern: dict[str, re.Pattern],
+    workers: int=EXTRACT_WORKERS,
+) -> dict[str, list]:
+    """
+    PURPOSE:
+
+        Get section boundaries of pdf, a section starts at every line matching code or province pattern
+        and lasts until next one. Only those patterns are searched, and for each section the first line,
+        and the code and province matches in force are kept, together with the first line of every page.
+        Pdf text is left in cache, so sections can be read later page by page
+
+    MANDATORY ARGUMENTS:
+
+        file: pdf file
+        check_line: line index and text to check on first page
+        pattern: compiled patterns, only code and province ones are used
+    """
+    boundary = {name: pattern[name] for name in SECTION_PATTERNS if name in pattern}
+    page_lines = []
+
+    def count_lines(pages):
+        for page in pages:
+            page_lines.append(page.count('\n') + 1)
+            yield page
+
+    pages = count_lines(iter_cached_pages(file, lambda start: iter_pages(file, workers, start)))
+    starts, states, state = [], [], {}
+
+    for number, matches in iter_numbered_matches(iter_pdf_lines(file, check_line, pages=pages), boundary):
+        state = {**state, **matches}
+        starts.append(number)
+        states.append(state)
+
+    # pages are separated by an empty line
+    page_starts = [0]
+    for page_count in page_lines[:-1]:
+        page_starts.append(page_starts[-1] + page_count + 1)
+
+    return {'starts': starts, 'states': states, 'page_starts': page_starts, 'lines': page_starts[-1] + page_lines[-1]}
+
+@counted('lines')
+def iter_section_lines(file: Path, index: dict[str, list], section: int) -> Iterator[str]:
+    # lines of section, only pages spanned by section are read from cached text
+
+    start = index['starts'][section]
+    end = index['starts'][section+1] if section + 1 < len(index['starts']) else index['lines']
+    page_starts = index['page_starts']
+    first = bisect_right(page_starts, start) - 1
+    last = bisect_right(page_starts, end - 1)
+
+    for page, text in enumerate(iter_cached_page_range(file, first, last), start=first):
+        if page > first:
+            yield ''
+        yield from text.split('\n')[max(start - page_starts[page], 0):end - page_starts[page]]
+
+def is_candidate_section(state: dict[str, dict], pattern: dict[str, re.Pattern], candidate: dict[str, str]) -> bool:
+    # False if no record of section can be taken for candidate, since its code (or province) was not selected
+
+    if 'code' not in state or get_param_in_match(state['code'], 'code') not in candidate['codes']:
+        return False
+
+    if 'province' in pattern:
+        return 'province' in state and get_param_in_match(state['province'], 'province').upper() in candidate['provinces']
+
+    return True
+
+def iter_section_matches(
+    file: Path,
+    check_line: dict[str, str | int],
+    pattern: dict[str, re.Pattern],
+    candidate: dict[str, str],
+    workers: int=EXTRACT_WORKERS,
+) -> Iterator[dict[str, dict]]:
+    """
+    PURPOSE:
+
+        Yield matched groups of every pattern line by line, only for sections of candidate codes and provinces.
+        Section index and records of every section are cached, so lines of a section are only parsed once.
+        Each section is preceded by the code and province matches in force at its start, so parsers get
+        the same state as if every line had been read
+
+    MANDATORY ARGUMENTS:
+
+        file: pdf file
+        check_line: line index and text to check on first page
+        pattern: compiled patterns
+        candidate: candidate data, only codes and provinces are used
+    """
+    boundary = {name: pattern[name] for name in SECTION_PATTERNS if name in pattern}
+    index_file = records_file(file, boundary, check_line, suffix='index')
+    index = load_object(index_file)
+
+    if index is None or not has_cached_pages(file):
+        index = index_sections(file, check_line, pattern, workers)
+        store_object(index_file, index)
+
+    # sections are kept in cache by chunks, records of a chunk are loaded or parsed section by section as they are
+    # yielded, and new ones are stored once chunk is done, so an interrupted run only parses again the last chunk
+    chunk, cached, missing = None, {}, {}
+    for section, state in enumerate(index['states']):
+        if not is_candidate_section(state, pattern, candidate):
+            continue
+
+        if section // CHECKPOINT_SECTIONS != chunk:
+            if missing:
+                store_section_records(file, pattern, chunk, missing, check_line)
+            chunk, missing = section // CHECKPOINT_SECTIONS, {}
+            cached = load_section_records(file, pattern, chunk, check_line)
+
+        if section in cached:
+            count('sections_cached')
+            records = cached.pop(section)
+        else:
+            count('sections_parsed')
+            records = missing[section] = list(iter_matches(iter_section_lines(file, index, section), pattern))
+
+        yield state
+        yield from records
+
+    if missing:
+        store_section_records(file, pattern, chunk, missing, check_line)
+
+def iter_pdf_matches(
+    file: Path,
+    check_line: dict[str, str | int],
+    pattern: dict[str, re.Pattern],
+    debug: bool=False,
+    workers: int=EXTRACT_WORKERS,
+    cache: bool=PDF_CACHE,
+    candidate: dict[str, str]=None,
+) -> Iterator[dict[str, dict]]:
+    """
+    PURPOSE:
+
+        Yield matched groups of every pattern line by line for pdf. Records and extracted text are
+        cached by pdf content and patterns, so the same pdf is only extracted and parsed once.
+        If candidate is given, sections of codes and provinces not selected by candidate are skipped
+
+    MANDATORY ARGUMENTS:
+
+        file: pdf file
+        check_line: line index and text to check on first page
+        pattern: compiled patterns
+    """
+    # debug txt is written while pages are read, so skip cache
+    if cache is False or debug is True:
+        yield from iter_matches(iter_pdf_lines(file, check_line, debug=debug, workers=workers), pattern)
+        return
+
+    if candidate is not None and 'code' in pattern:
+        yield from iter_section_matches(file, check_line, pattern, candidate, workers)
+        return
+
+    records = load_records(file, pattern, check_line)
+    if records is not None:
+        count('records_cached', len(records))
+        yield from records
+        return
+
+    pages = iter_cached_pages(file, lambda start: iter_pages(file, workers, start))
+    lines = iter_pdf_lines(file, check_line, pages=pages)
+    yield from store_records(file, pattern, iter_matches(lines, pattern), check_line)
 
 def pdf2txt(pdf_file: Path, txt_file: Path) -> None:
     """
@@ -44,74 +590,206 @@ def pdf2txt(pdf_file: Path, txt_file: Path) -> None:
     with open(txt_file, 'w') as f:
         f.write(f'{text}')
 
-def coordinates_of(city: str) -> tuple[float]:
+def province_regex(template: str, provinces: list[str]) -> re.Pattern:
+    # template has a {provinces} field, filled with provinces in upper and title case
 
-    loc = Nominatim(user_agent="GetLoc", timeout=DEFAULT_TIMEOUT).geocode(city)
-    if not loc:
-        raise ValueError(f'Point \'{city}\' not found')
-    return (loc.latitude, loc.longitude)
-        
-def distance_from_home(home: str, city: str) -> float:
+    province_list = [f'{province.upper()}' for province in provinces]
+    province_list += [f'{province.title()}' for province in provinces]
+    province_pattern = '|'.join(province_list)
+    return re.compile(template.format(provinces=province_pattern), re.MULTILINE | re.ASCII)
 
-    home_coordinates = coordinates_of(home)
-    coords = coordinates_of(city)
-    return geodesic(home_coordinates, coords).km
+def city_coordinates(df: pd.DataFrame | dict[str, list], offline: bool=False) -> tuple[np.ndarray]:
+    # latitude and longitude of city in every row of dataframe or offert table, from gazetteer by name and only
+    # unknown cities are geocoded (or only looked up in geocode cache if offline). Cities not found are NaN
 
-def include_city_in_db(distance_db: dict[str, int], candidate: dict[str, str | list], city: str) -> int:
-    # slow method, so let's keep a db just in case city appears more than once
+    cities = list(zip(df['city'], df['city_id']))
+    distinct = list(dict.fromkeys(cities))
+    if profiler():
+        count('geocode_gazetteer_hits', sum(1 for city, _ in distinct if gazetteer().coordinates_of(city)))
+    coordinates = {city: known_coordinates_of(*city) for city in distinct} if offline else resolve_cities(distinct)
 
-    if city not in distance_db:
-        distance_db[city] = round(distance_from_home(candidate['home'], city))
-                                
-    return distance_db
-    
+    latitude = np.array([coordinates[city][0] if coordinates[city] else np.nan for city in cities], dtype=float)
+    longitude = np.array([coordinates[city][1] if coordinates[city] else np.nan for city in cities], dtype=float)
+    return latitude, longitude
+
+def add_distance_column(
+    df: pd.DataFrame,
+    candidate: dict[str, str | list],
+    debug: bool=False,
+    coordinates: tuple[np.ndarray]=None,
+) -> pd.DataFrame:
+    # one vectorized pass over all rows, coordinates of cities are got with city_coordinates if not given
+
+    if debug is True or df.empty:
+        df['distance_km'] = 0
+        return df
+
+    import pandas as pd
+
+    distance = home_distance(df, candidate, coordinates)
+    df['distance_km'] = pd.array(distance, dtype='Int64') if np.isnan(distance).any() else distance.astype(int)
+
+    return df
+
+def add_distance_values(table: dict[str, list], candidate: dict[str, str | list], debug: bool=False) -> dict[str, list]:
+    # same distances as add_distance_column for offert table, cities not found are None
+
+    size = len(table['code'])
+    if debug is True or size == 0:
+        table['distance_km'] = [0] * size
+        return table
+
+    distance = home_distance(table, candidate)
+    table['distance_km'] = [None if np.isnan(value) else int(value) for value in distance.tolist()]
+
+    return table
+
+def home_distance(df: pd.DataFrame | dict[str, list], candidate: dict[str, str | list], coordinates: tuple[np.ndarray]=None) -> np.ndarray:
+    # rounded km from candidate home to city of every row, NaN if city is not found
+
+    with stage('geocode'):
+        latitude, longitude = city_coordinates(df) if coordinates is None else coordinates
+
+        # cities not found are left empty
+        home_latitude, home_longitude = coordinates_of(candidate['home'])
+
+    return np.round(geodesic_km(home_latitude, home_longitude, latitude, longitude))
+
+def build_place_index(df: pd.DataFrame | dict[str, list]) -> dict[tuple[str], int | list[int]]:
+    # (code, school_id, city_id) -> row index, built once per results pdf. Repeated places get a list of row indexes
+    # and are all reported here in one warning, a results line of one of them is then an error in find_place.
+    # Rows of offert tables are numbered from 1 as in dataframes
+
+    index = {}
+    rows = range(1, len(df['code']) + 1) if isinstance(df, dict) else df.index
+    for idx, key in zip(rows, zip(df['code'], df['school_id'], df['city_id'])):
+        if key in index:
+            index[key] = (index[key] if isinstance(index[key], list) else [index[key]]) + [idx]
+        else:
+            index[key] = idx
 
-def is_in_df(df: pd.DataFrame, code: str, school_id: int, city_id: int) -> bool:
+    repeated = [key for key, idx in index.items() if isinstance(idx, list)]
+    if repeated:
+        print(f' Warning: {len(repeated)} places with multiple rows, their results cannot be matched: '
+              f'{", ".join(str(key) for key in repeated)}')
 
-    df = df[(df['code']==code) & (df['school_id']==school_id) & (df['city_id']==city_id)]
-    return not df.empty
+    return index
 
-def get_index(df: pd.DataFrame, code: str, school_id: int, city_id: int) -> list[int]:
+def find_place(index: dict[tuple[str], int | list[int]], key: tuple[str]) -> int | None:
+    # row index of place, None if not in df. Only places found in results must be unique, repeated places
+    # were already reported by build_place_index
 
-    df = df[(df['code']==code) & (df['school_id']==school_id) & (df['city_id']==city_id)]
-    return df.index.to_list()
+    idx = index.get(key)
+    if isinstance(idx, list):
+        raise ValueError(f'Multiple rows with {key} entries')
+
+    return idx
+
+def apply_updates(df: pd.DataFrame, updates: dict[str, dict[int, str | int]]) -> pd.DataFrame:
+    # write all values found for each column at once, keep column dtype if values fit in it
+
+    for column, values in updates.items():
+        if not values:
+            continue
+
+        series = df[column].astype(object)
+        series.loc[list(values)] = list(values.values())
+        try:
+            df[column] = series.astype(df[column].dtype)
+        except (TypeError, ValueError):
+            df[column] = series
+
+    return df
+
+def apply_table_updates(table: dict[str, list], updates: dict[str, dict[int, str | int]], types: dict[str, type]) -> dict[str, list]:
+    # result columns of offert table as apply_updates leaves them in dataframe: values are cast to column type
+    # if all of them fit, missing values are None ('nan' in str columns)
+
+    size = len(table['code'])
+    for column, type_ in types.items():
+        values = updates.get(column, {})
+        try:
+            values = {idx: type_(value) for idx, value in values.items()}
+        except (TypeError, ValueError):
+            pass
+
+        default = 'nan' if type_ is str else None
+        table[column] = [values.get(idx, default) for idx in range(1, size + 1)]
+
+    return table
+
+def normalize_name(name: str) -> str:
+
+    return name.replace(' ', '').upper()
 
 def is_name_match(name: str, candidate: dict[str, str | list]) -> bool:
 
-    return name.replace(' ', '').upper() == candidate['name'].replace(' ', '').upper()
+    return normalize_name(name) == normalize_name(candidate['name'])
 
-def get_param_in_match(match, param: str) -> str:
+def get_param_in_match(match: re.Match | dict[str, str], param: str) -> str:
 
     output = None
-    if param in match.groupdict() and match[param]:
+    groups = match if isinstance(match, dict) else match.groupdict()
+    if param in groups and match[param]:
         output = match[param].strip()
     
     return output
 
-def parse_offert_pdf(
-    file: Path,
-    candidate: dict[str, str],
-    pattern: dict[str, str],
-    check_line: dict[str, str | int],
-    df: pd.DataFrame,
-    debug: bool=False,
-) -> pd.DataFrame:
+def new_participant_table() -> dict[str, list]:
 
-    distance_db = {}
-    text = pdf2str(file)
-    lines = text.split('\n')
+    return {field: [] for field in PARTICIPANT_FIELDS}
 
-    # check that this is the pdf
-    if not lines[check_line['idx']].strip().startswith(check_line['text']):
-        raise RuntimeError(f'Wrong format for file \'{file}\'')
+def participant_table_to_df(table: dict[str, list]) -> pd.DataFrame:
+    # one row per candidate entry, names are normalized and repeated names and codes are stored once
+    import pandas as pd
 
-    if debug is True:
-        pdf2txt(file, file.with_suffix('.txt'))
-    
-    for line in lines:
-        code_match = pattern['code'].search(line)
-        province_match = pattern['province'].search(line)
-        school_match = pattern['school'].search(line)
+    data = {field: pd.Categorical(table[field]) if field in ['code', 'name'] else table[field] for field in PARTICIPANT_FIELDS}
+    return pd.DataFrame(data, columns=PARTICIPANT_FIELDS)
+
+def build_name_index(participants: pd.DataFrame) -> dict[str, np.ndarray]:
+    # normalized name -> positions of its rows in participant table, built once per results pdf
+
+    codes = participants['name'].cat.codes.to_numpy()
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(participants['name'].cat.categories) + 1))
+
+    return {name: order[bounds[idx]:bounds[idx+1]] for idx, name in enumerate(participants['name'].cat.categories)}
+
+def find_participant(participants: pd.DataFrame, index: dict[str, np.ndarray], name: str) -> pd.DataFrame:
+    # entries of name in participant table, empty if name is not in results
+
+    return participants.iloc[index.get(normalize_name(name), [])]
+
+def new_offert_table() -> dict[str, list]:
+
+    return {field: [] for field in OFFERT_FIELDS}
+
+def offert_table_to_df(table: dict[str, list], columns: list[str]) -> pd.DataFrame:
+    # materialize dataframe once, columns not parsed (e.g. results) are left empty
+    import pandas as pd
+
+    size = len(table['code'])
+    data = {}
+    for column in columns:
+        if column not in table:
+            data[column] = np.full(size, np.nan)
+        elif column in CATEGORICAL_COLUMNS:
+            data[column] = pd.Categorical(table[column])
+        else:
+            data[column] = table[column]
+
+    return pd.DataFrame(data, columns=columns, index=pd.RangeIndex(1, size+1))
+
+def iter_offert_records(
+    records: Iterator[dict[str, dict]],
+    candidate: dict[str, str]=None,
+) -> Iterator[tuple]:
+    # rows in OFFERT_FIELDS order, only for candidate codes and provinces if candidate is given
+
+    for matches in records:
+        code_match = matches.get('code')
+        province_match = matches.get('province')
+        school_match = matches.get('school')
 
         if code_match:
             code = get_param_in_match(code_match, 'code')
@@ -122,7 +800,7 @@ def parse_offert_pdf(
 
         if school_match:
 
-            if code in candidate['codes'] and province in candidate['provinces']:
+            if candidate is None or (code in candidate['codes'] and province in candidate['provinces']):
                 city = get_param_in_match(school_match, 'city')
                 city_id = get_param_in_match(school_match, 'city_id')
                 school_name = get_param_in_match(school_match, 'school_name')
@@ -133,180 +811,438 @@ def parse_offert_pdf(
                 type_ = get_param_in_match(school_match, 'type')
                 type_ = re.sub(r'\s+', ' ', type_) if type_ else None
 
-                distance_db = include_city_in_db(distance_db, candidate, city)
-                distance = 0 if debug is True else distance_db[city]
-                row = {'code': code, 'subject': subject,'province': province, 'city': city, 'city_id': city_id, 'distance_km': distance,
-                        'school_name': school_name, 'school_id': school_id, 'hours': hours, 'language': language, 'itinerant': itinerant,
-                        'type': type_}
-                df.loc[len(df)+1] = row
+                # distance is filled later
+                yield (code, subject, province, city, city_id, None, school_name, school_id, hours, language, itinerant, type_)
 
-    return df
+def parse_offert_records(
+    records: Iterator[dict[str, dict]],
+    candidate: dict[str, str],
+    table: dict[str, list]=None,
+) -> dict[str, list]:
 
-def parse_result_dificil_pdf(
+    table = new_offert_table() if table is None else table
+    columns = [table[field] for field in OFFERT_FIELDS]
+
+    for row in iter_offert_records(records, candidate):
+        for column, value in zip(columns, row):
+            column.append(value)
+
+    return table
+
+def parse_offert_lines(
+    lines: Iterator[str],
+    candidate: dict[str, str],
+    pattern: dict[str, re.Pattern],
+    table: dict[str, list]=None,
+) -> dict[str, list]:
+
+    return parse_offert_records(iter_matches(lines, pattern), candidate, table)
+
+def parse_offert_pdf(
     file: Path,
     candidate: dict[str, str],
-    pattern: dict[str, str],
+    pattern: dict[str, re.Pattern],
     check_line: dict[str, str | int],
     df: pd.DataFrame,
     debug: bool=False,
+    records: Iterator[dict[str, dict]]=None,
+) -> pd.DataFrame:
+
+    records = iter_pdf_matches(file, check_line, pattern, debug=debug, candidate=candidate) if records is None else records
+    table = parse_offert_records(records, candidate)
+    df = offert_table_to_df(table, df.columns.to_list())
+
+    return add_distance_column(df, candidate, debug=debug)
+
+def parse_result_dificil_records(
+    records: Iterator[dict[str, dict]],
+    candidate: dict[str, str],
+    df: pd.DataFrame,
+    participants: dict[str, list]=None,
 ) -> pd.DataFrame:
 
-    idx, last_idx = None, None
-    text = pdf2str(file)
-    lines = text.split('\n')
     df['groups'] = df['groups'].astype(str)
+    updates, _ = result_dificil_updates(records, candidate, build_place_index(df), participants)
+    return apply_updates(df, updates)
 
-    # check that this is the pdf
-    if not lines[check_line['idx']].strip().startswith(check_line['text']):
-        raise RuntimeError(f'Wrong format for file \'{file}\'')
+def result_dificil_updates(
+    records: Iterator[dict[str, dict]],
+    candidate: dict[str, str],
+    index: dict[tuple[str], int | list[int]],
+    participants: dict[str, list]=None,
+) -> tuple[dict[str, dict[int, str | int]], dict[str, list]]:
+    # values of result columns by row index of place, rows as in build_place_index, and entries of candidate codes
 
-    if debug is True:
-        pdf2txt(file, file.with_suffix('.txt'))
-    
-    for line in lines:
+    idx, last_idx = None, None
+    code, subject, school_id, city_id = None, None, None, None
+    selected = False  # code is one of candidate codes
+    you = normalize_name(candidate['name'])
+    updates = {'winner': {}, 'you': {}, 'total': {}, 'groups': {}}
+    lookups = 0
+    columns = [participants[field] for field in PARTICIPANT_FIELDS] if participants is not None else None
+    entries = {field: [] for field in STATS_ENTRY_FIELDS['dificil']}
+    entry_columns = [entries[field] for field in STATS_ENTRY_FIELDS['dificil']]
 
-        code_match = pattern['code'].search(line)
-        place_match = pattern['place'].search(line)
-        candidate_match = pattern['candidate'].search(line)
+    for matches in records:
+
+        code_match = matches.get('code')
+        place_match = matches.get('place')
+        candidate_match = matches.get('candidate')
 
         if code_match:
             code = get_param_in_match(code_match, 'code')
+            subject = get_param_in_match(code_match, 'subject')
+            selected = code in candidate['codes']
 
         if place_match:
             school_id = get_param_in_match(place_match, 'school_id')
             city_id = get_param_in_match(place_match, 'city_id')
 
             # if this place is in df, then get row index and if it is a new place reset variables
-            if is_in_df(df, code, school_id, city_id):
-                idx = get_index(df, code, school_id, city_id)
+            idx = find_place(index, (code, school_id, city_id))
+            lookups += 1
 
-                if len(idx) > 1:
-                    raise ValueError(f'Multiple rows with {(code, school_id, city_id)} entries')
-
-                idx = idx[0]
+            if idx is not None:
                 new_place = True if idx != last_idx else False
                 last_idx = idx
 
                 if new_place:
                     groups = {'1': 0, '2': 0, '3': 0}
 
-            else:
-                idx = None
-
-        if idx and candidate_match:
+        if candidate_match and (idx or columns or selected):
             position = get_param_in_match(candidate_match, 'position')
             position = int(position) if position.isdigit() else position
             assigned = get_param_in_match(candidate_match, 'assigned')
-            name = get_param_in_match(candidate_match, 'name')
+            name = normalize_name(get_param_in_match(candidate_match, 'name'))
             group = get_param_in_match(candidate_match, 'group')
 
+            if columns:
+                for column, value in zip(columns, (code, school_id, city_id, position, name, group, bool(assigned))):
+                    column.append(value)
+
+            if selected:
+                for column, value in zip(entry_columns, (code, subject, f'{school_id}/{city_id}', position, group,
+                                                         bool(assigned), name == you)):
+                    column.append(value)
+
+        if idx and candidate_match:
+
             if assigned:
-                df.at[idx, 'winner'] = position
+                updates['winner'][idx] = position
 
-            if is_name_match(name, candidate):
-                df.at[idx, 'you'] = position
+            if name == you:
+                updates['you'][idx] = position
 
             if int(group) < 4:
                 groups[group] += 1
             
-            df.at[idx, 'total'] = position
-            df.at[idx, 'groups'] = f'{groups["1"]}/{groups["2"]}/{groups["3"]}'
+            updates['total'][idx] = position
+            updates['groups'][idx] = f'{groups["1"]}/{groups["2"]}/{groups["3"]}'
 
-    return df
+    count('index_lookups', lookups)
+    return updates, entries
 
-def parse_result_continua_pdf(
+def parse_result_dificil_pdf(
     file: Path,
     candidate: dict[str, str],
-    pattern: dict[str, str],
+    pattern: dict[str, re.Pattern],
     check_line: dict[str, str | int],
     df: pd.DataFrame,
     debug: bool=False,
+    records: Iterator[dict[str, dict]]=None,
 ) -> pd.DataFrame:
 
-    code = None
-    info = {}
-    df['winner'] = df['winner'].astype('Int64')
+    records = iter_pdf_matches(file, check_line, pattern, debug=debug, candidate=candidate) if records is None else records
+    return parse_result_dificil_records(records, candidate, df)
 
-    text = pdf2str(file)
-    lines = text.split('\n')
+def parse_result_continua_records(
+    records: Iterator[dict[str, dict]],
+    candidate: dict[str, str],
+    df: pd.DataFrame,
+    participants: dict[str, list]=None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
 
-    # check that this is the pdf
-    if not lines[check_line['idx']].strip().startswith(check_line['text']):
-        raise RuntimeError(f'Wrong format for file \'{file}\'')
+    import pandas as pd
 
-    if debug is True:
-        pdf2txt(file, file.with_suffix('.txt'))
-    
-    for line in lines:
+    df['winner'] = df['winner'].astype('Int64')
+    updates, entries = result_continua_updates(records, candidate, build_place_index(df), participants)
+    return apply_updates(df, updates), pd.DataFrame(result_stats(entries, 'continua'), columns=STATS_COLUMNS, dtype=object)
 
-        code_match = pattern['code'].search(line)
-        candidate_match = pattern['candidate'].search(line)
-        place_match = pattern['place'].search(line)
-        type_match = pattern['type'].search(line)
+def result_continua_updates(
+    records: Iterator[dict[str, dict]],
+    candidate: dict[str, str],
+    index: dict[tuple[str], int | list[int]],
+    participants: dict[str, list]=None,
+) -> tuple[dict[str, dict[int, str | int]], dict[str, list]]:
+    # values of result columns by row index of place, rows as in build_place_index, and every record of candidate
+    # codes as an entry, so statistics are counted at once later
+
+    code, subject, position = None, None, None
+    selected = False  # code is one of candidate codes
+    you = normalize_name(candidate['name'])
+    entry = None  # row of last entry in participants, its place comes in next lines
+    updates = {'winner': {}, 'you': {}}
+    lookups = 0
+    columns = [participants[field] for field in PARTICIPANT_FIELDS] if participants is not None else None
+    entries = {field: [] for field in STATS_ENTRY_FIELDS['continua']}
+    entry_columns = [entries[field] for field in STATS_ENTRY_FIELDS['continua']]
+
+    for matches in records:
+
+        code_match = matches.get('code')
+        candidate_match = matches.get('candidate')
+        place_match = matches.get('place')
+        type_match = matches.get('type')
 
         if code_match:
             code = get_param_in_match(code_match, 'code')
             subject = get_param_in_match(code_match, 'subject')
+            selected = code in candidate['codes']
 
         if candidate_match:
             position = get_param_in_match(candidate_match, 'position')
             position = int(position) if position.isdigit() else position
-            name = f'{candidate_match["surname"].strip()} {candidate_match["name"].strip()}'
+            name = normalize_name(f'{candidate_match["surname"].strip()} {candidate_match["name"].strip()}')
 
+            if columns:
+                entry = len(columns[0])
+                for column, value in zip(columns, (code, None, None, position, name, None, False)):
+                    column.append(value)
+
+        type_, result = None, None
         if type_match:
             type_ = get_param_in_match(type_match, 'type')
             type_ = type_.title() if type_ else type_
             result = get_param_in_match(type_match, 'result')
 
-        if code in candidate['codes']:
-
-            if code not in info:
-                info[code] = {}
-                info[code]['subject'] = subject
-                info[code]['results'] = {}
-                info[code]['types'] = {}
-                info[code]['candidate_position'] = None
-                info[code]['total_positions'] = None
-
-            if type_match:
-                info[code]['results'][result] = info[code]['results'][result]+1 if result in info[code]['results'] else 1
-                if type_:
-                    info[code]['types'][type_] = info[code]['types'][type_]+1 if type_ in info[code]['types'] else 1
-
-            if candidate_match and is_name_match(name, candidate):
-                info[code]['candidate_position'] = position
-
-            info[code]['total_positions'] = position
+        if selected:
+            for column, value in zip(entry_columns, (code, subject, position, candidate_match is not None and name == you,
+                                                     result, type_)):
+                column.append(value)
 
         if place_match:
             school_id = get_param_in_match(place_match, 'school_id')
             city_id = get_param_in_match(place_match, 'city_id')
 
+            if entry is not None:
+                participants['school_id'][entry] = school_id
+                participants['city_id'][entry] = city_id
+                participants['assigned'][entry] = True
+                entry = None
+
             # if this place is in df, then get row index
-            if is_in_df(df, code, school_id, city_id):
-                idx = get_index(df, code, school_id, city_id)
+            idx = find_place(index, (code, school_id, city_id))
+            lookups += 1
+
+            if idx is not None:
+                updates['winner'][idx] = position
+
+                if name == you:
+                    updates['you'][idx] = 'YES'
+
+    count('index_lookups', lookups)
+    return updates, entries
+
+def parse_result_continua_pdf(
+    file: Path,
+    candidate: dict[str, str],
+    pattern: dict[str, re.Pattern],
+    check_line: dict[str, str | int],
+    df: pd.DataFrame,
+    debug: bool=False,
+    records: Iterator[dict[str, dict]]=None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+
+    records = iter_pdf_matches(file, check_line, pattern, debug=debug, candidate=candidate) if records is None else records
+    return parse_result_continua_records(records, candidate, df)
+
+def first_order(keys: np.ndarray) -> tuple[np.ndarray, list[str]]:
+    # id of every key, ids numbered in order of first appearance, and key of every id.
+    # Only distinct keys are sorted, keys are found among them as fixed width strings
+
+    values = list(dict.fromkeys(keys.tolist()))
+    distinct = np.array(values, dtype=str)
+    order = np.argsort(distinct)
+    return order[np.searchsorted(distinct[order], keys.astype(str, copy=False))], values
+
+def edge_index(ids: np.ndarray, mask: np.ndarray, size: int, first: bool=False) -> np.ndarray:
+    # index of last (or first) entry of every id where mask is True, -1 if there is none
+
+    indexes = np.flatnonzero(mask)
+    if first:
+        edge = np.full(size, len(ids))
+        np.minimum.at(edge, ids[mask], indexes)
+        return np.where(edge < len(ids), edge, -1)
 
-                if len(idx) > 1:
-                    raise ValueError(f'Multiple rows with {(code, school_id, city_id)} entries')
+    edge = np.full(size, -1)
+    np.maximum.at(edge, ids[mask], indexes)
+    return edge
 
-                idx = idx[0]
-                df.at[idx, 'winner'] = position
+def label_counts(code_ids: np.ndarray, labels: np.ndarray, size: int) -> list[list[tuple]]:
+    # number of entries of every code by label, labels of a code in order of first appearance, None is left out
 
-                if is_name_match(name, candidate):
-                    df.at[idx, 'you'] = 'YES'
+    counts = [[] for _ in range(size)]
+    known = np.not_equal(labels, None)
+    if not known.any():
+        return counts
 
-    return df, info
+    label_ids, label_values = first_order(labels[known])
+    pairs = code_ids[known] * len(label_values) + label_ids
+    pair_counts = np.bincount(pairs, minlength=size * len(label_values))
+    first = edge_index(pairs, np.ones(len(pairs), dtype=bool), len(pair_counts), first=True)
+    keys = np.flatnonzero(pair_counts)
+    for key in keys[np.lexsort((first[keys], keys // len(label_values)))].tolist():
+        counts[key // len(label_values)].append((label_values[key % len(label_values)], int(pair_counts[key])))
+
+    return counts
+
+def result_stats(entries: dict[str, list], option: str) -> dict[str, list]:
+    """
+    PURPOSE:
+
+        Get statistics of every candidate code in results from entries kept by result parser, counted with numpy
+        over arrays of codes and labels. Table has columns code, subject, stat, label and value, codes in order of
+        results:
+
+        - continua: position of candidate (last position if repeated) and total (last position in code),
+          participation (number of candidates by result label) and duration (number of places by type label)
+        - dificil: places, entries, assigned places and group (entries of groups 1, 2 and 3 by group label),
+          position of candidate in the place where it is best and total (last position in that place)
+
+        and candidate percentile, percentage of candidates behind candidate. Statistics with no value are left out
+
+    MANDATORY ARGUMENTS:
+
+        entries: entries of candidate codes as filled by result_dificil_updates or result_continua_updates
+        option: dificil or continua
+    """
+    stats = {column: [] for column in STATS_COLUMNS}
+    if not entries['code']:
+        return stats
+
+    code_ids, codes = first_order(np.array(entries['code'], dtype=str))
+    size = len(codes)
+    subject = np.array(entries['subject'] + [None], dtype=object)  # None at -1 for codes without subject
+    subjects = subject[edge_index(code_ids, np.not_equal(subject[:-1], None), size, first=True)]
+    position = np.array(entries['position'] + [None], dtype=float)  # nan at -1 for codes without position
+    known = ~np.isnan(position[:-1])
+    you = np.array(entries['you'], dtype=bool)
+
+    if option == 'continua':
+        total = position[edge_index(code_ids, known, size)]
+        you_position = position[edge_index(code_ids, known & you, size)]
+        breakdowns = [('participation', label_counts(code_ids, np.array(entries['result'], dtype=object), size)),
+                      ('duration', label_counts(code_ids, np.array(entries['type'], dtype=object), size))]
+    else:
+        _, place_ids = np.unique(np.array(entries['place'], dtype=str), return_inverse=True)
+        place_count = place_ids.max() + 1
+        code_places, pair_ids = np.unique(code_ids * place_count + place_ids.reshape(-1), return_inverse=True)
+        pair_ids = pair_ids.reshape(-1)
+        place_last = edge_index(pair_ids, known, len(code_places))
+
+        # best place of candidate is first entry with lowest position
+        candidate_entries = np.flatnonzero(known & you)
+        candidate_entries = candidate_entries[np.lexsort((candidate_entries, position[candidate_entries],
+                                                          code_ids[candidate_entries]))]
+        best = np.full(size, -1)
+        best_codes, first = np.unique(code_ids[candidate_entries], return_index=True)
+        best[best_codes] = candidate_entries[first]
+        you_position = position[best]
+        total = np.where(best >= 0, position[place_last[pair_ids[best]]], np.nan)
+
+        group = np.array(entries['group'], dtype=object)
+        group_counts = [np.bincount(code_ids[group == label], minlength=size) for label in STATS_GROUPS]
+        single = lambda values: [[(None, int(value))] for value in values]
+        breakdowns = [('places', single(np.bincount(code_places // place_count, minlength=size))),
+                      ('entries', single(np.bincount(code_ids, minlength=size))),
+                      ('assigned', single(np.bincount(code_ids, weights=np.array(entries['assigned'], dtype=float),
+                                                      minlength=size))),
+                      ('group', [[(label, int(counts[code])) for label, counts in zip(STATS_GROUPS, group_counts)]
+                                 for code in range(size)])]
+
+    percentile = np.round(100 * (total - you_position) / total, 1)
+
+    for code_id, (code, subject) in enumerate(zip(codes, subjects)):
+        rows = [('position', None, you_position[code_id]), ('total', None, total[code_id]),
+                ('percentile', None, percentile[code_id])]
+        rows = [(stat, label, int(value) if stat != 'percentile' else float(value)) for stat, label, value in rows
+                if not np.isnan(value)]
+        rows += [(stat, label, value) for stat, counts in breakdowns for label, value in counts[code_id]]
+        for stat, label, value in rows:
+            for column, item in zip(STATS_COLUMNS, (code, subject, stat, label, value)):
+                stats[column].append(item)
+
+    return stats
+
+def write_stats(stats: dict[str, list], json_file: Path) -> None:
+
+    rows = [dict(zip(STATS_COLUMNS, row)) for row in zip(*(stats[column] for column in STATS_COLUMNS))]
+    with atomic_file(json_file) as tmp_file:
+        with open(tmp_file, 'w', encoding='utf-8') as file:
+            json.dump(rows, file, ensure_ascii=False, indent=1, separators=(',', ':'))
+
+@contextmanager
+def atomic_file(file: Path) -> Iterator[Path]:
+    # temporary file next to file, renamed to it once written, so readers never see a half written file
+
+    tmp_file = Path(f'{file}.{os.getpid()}.tmp')
+    try:
+        yield tmp_file
+        os.replace(tmp_file, file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+
+def write_csv(df: pd.DataFrame, csv_file: Path) -> None:
+
+    with atomic_file(csv_file) as tmp_file:
+        df.to_csv(tmp_file, sep=CSV_SEPARATOR, index=False)
+
+def write_records(table: dict[str, list], columns: list[str], csv_file: Path) -> None:
+    """
+    PURPOSE:
+
+        Write offert table to csv without pandas, same csv as write_csv of the table as dataframe: csv writer
+        and line terminator of pandas, None is left empty and columns not in table are empty
+
+    MANDATORY ARGUMENTS:
+
+        table: offert table, result columns as in apply_table_updates
+        columns: columns of csv
+        csv_file: csv file
+    """
+    size = len(table['code'])
+    values = [table[column] if column in table else [None] * size for column in columns]
+
+    with atomic_file(csv_file) as tmp_file:
+        with open(tmp_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter=CSV_SEPARATOR, lineterminator=os.linesep)
+            writer.writerow(columns)
+            writer.writerows(zip(*values))
+
+def write_parquet(table: dict[str, list], columns: list[str], parquet_file: Path) -> None:
+    # optional columnar output for analytics, needs pandas and pyarrow
+
+    with atomic_file(parquet_file) as tmp_file:
+        offert_table_to_df(table, columns).to_parquet(tmp_file, engine='pyarrow', index=False)
 
 def process_args(help_foo):
+    # --profile writes a json report of stage times and counters next to summary,
+    # --cprofile also writes a cProfile dump of every stage and --parquet also writes summary as parquet
 
-    if len(sys.argv) not in [2, 3]:
+    flags = [arg for arg in sys.argv[1:] if arg.startswith('--')]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+
+    if len(args) not in [1, 2] or any(flag not in ['--profile', '--cprofile', '--parquet'] for flag in flags):
         help_foo()
         raise RuntimeError('Arguments are missing or incorrect')
     
-    pdf_offert_file = Path(sys.argv[1])
-    pdf_result_file = Path(sys.argv[2]) if len(sys.argv) == 3 else None
+    pdf_offert_file = Path(args[0])
+    pdf_result_file = Path(args[1]) if len(args) == 2 else None
+
+    if '--profile' in flags or '--cprofile' in flags:
+        enable_profiling(pdf_offert_file.with_name(f'{pdf_offert_file.stem}_cprofile') if '--cprofile' in flags else None)
 
-    return pdf_offert_file, pdf_result_file
+    return pdf_offert_file, pdf_result_file, '--parquet' in flags
 
 def process_files(
     pdf_offert_file: Path,
@@ -319,8 +1255,22 @@ def process_files(
     result_check_line: dict[str, str],
     default_columns: list[str],
     extra_columns: list[str],
-    debug=False
+    debug=False,
+    workers: int=EXTRACT_WORKERS,
+    parquet: bool=False,
 ):
+    """
+    PURPOSE:
+
+        Write summary csv of offerts, with results if results pdf is given, next to offerts pdf. Offerts are kept
+        in an offert table and written without pandas, statistics of results too, pandas is only loaded for parquet output
+
+    MANDATORY ARGUMENTS:
+
+        pdf_offert_file: pdf file with place offerts
+        pdf_result_file: pdf file with final results, or None
+        option: dificil or continua
+    """
 
     if not Path(pdf_offert_file).exists():
         raise FileNotFoundError(f'File \'{pdf_offert_file}\' not found')
@@ -328,36 +1278,77 @@ def process_files(
     if pdf_result_file and not Path(pdf_result_file).exists():
         raise FileNotFoundError(f'File \'{pdf_result_file}\' not found')
 
+    # checked before parsing, but pyarrow is only imported when parquet is written
+    if parquet and importlib.util.find_spec('pyarrow') is None:
+        raise ImportError('pyarrow is needed for parquet summary, install it with \'pip install pyarrow\'')
+
     csv_file = pdf_offert_file.with_suffix('.csv')
 
     columns = default_columns + extra_columns if pdf_result_file else default_columns
-    df = pd.DataFrame(columns=columns)
+
+    # both pdfs are independent, so results pdf is read in background while offerts pdf is parsed
+    offert_records = iter_pdf_matches(pdf_offert_file, offert_check_line, offert_pattern, debug=debug, workers=workers,
+                                      candidate=candidate)
+    result_records = prefetch(iter_pdf_matches(pdf_result_file, result_check_line, result_pattern, debug=debug, workers=workers,
+                                               candidate=candidate)) if pdf_result_file else None
 
     print(f'Processing {pdf_offert_file} file ')
-    df = parse_offert_pdf(pdf_offert_file, candidate, offert_pattern, offert_check_line, df, debug=debug)
+    with stage('offerts'):
+        table = add_distance_values(parse_offert_records(offert_records, candidate), candidate, debug=debug)
 
     if pdf_result_file:
         print(f'Processing {pdf_result_file} file ')
-        if option == 'dificil':
-            df = parse_result_dificil_pdf(pdf_result_file, candidate, result_pattern, result_check_line, df, debug=debug)
-        else:
-            df, info = \
-                parse_result_continua_pdf(pdf_result_file, candidate, result_pattern, result_check_line, df, debug=debug)
-            print_continua_info(info)
+        with stage('results'):
+            index = build_place_index(table)
+            if option == 'dificil':
+                updates, entries = result_dificil_updates(result_records, candidate, index)
+            else:
+                updates, entries = result_continua_updates(result_records, candidate, index)
+            apply_table_updates(table, updates, RESULT_COLUMN_TYPES[option])
+
+        with stage('stats'):
+            stats = result_stats(entries, option)
+        if option == 'continua':
+            print_continua_info(stats)
 
-    df.to_csv(csv_file, sep=CSV_SEPARATOR, index=False)
+    with stage('write'):
+        write_records(table, columns, csv_file)
+    count('rows', len(table['code']))
     print(f'See summary in \'{csv_file}\'')
 
-def print_continua_info(info: dict[str, str | dict]):
+    if pdf_result_file:
+        stats_file = csv_file.with_name(f'{csv_file.stem}_stats.json')
+        write_stats(stats, stats_file)
+        print(f'See statistics in \'{stats_file}\'')
+
+    if parquet:
+        parquet_file = csv_file.with_suffix('.parquet')
+        write_parquet(table, columns, parquet_file)
+        print(f'See summary in \'{parquet_file}\'')
+
+    if profiler():
+        report_file = csv_file.with_name(f'{csv_file.stem}_profile.json')
+        profiler().write(report_file, offerts=str(pdf_offert_file), results=str(pdf_result_file) if pdf_result_file else None)
+        print(f'See profile in \'{report_file}\'')
+
+def print_continua_info(stats: dict[str, list] | pd.DataFrame):
+    # statistics of every code as in result_stats, as table or dataframe
+
+    rows = {}
+    for code, subject, stat, label, value in zip(*(stats[column] for column in STATS_COLUMNS)):
+        rows.setdefault(code, (subject, []))[1].append((stat, label, value))
+
+    for code, (subject, code_rows) in rows.items():
 
-    for code in info:
+        value = {stat: value for stat, label, value in code_rows if label is None}
+        percentile = f' (ahead of {value["percentile"]}% of candidates)' if 'percentile' in value else ''
 
-        print(f'Info for {code} - {info[code]["subject"]}:')
-        print(f' Your position is {info[code]["candidate_position"]} out of {info[code]["total_positions"]}')
+        print(f'Info for {code} - {subject}:')
+        print(f' Your position is {value.get("position")} out of {value.get("total")}{percentile}')
         print(' Number of candidates by participation:')
-        for result in info[code]['results']:
-            print(f'  - {result}: {info[code]["results"][result]}')
+        for label, count_ in ((label, value) for stat, label, value in code_rows if stat == 'participation'):
+            print(f'  - {label}: {count_}')
         print(' Number of places by duration:')
-        for type_ in info[code]['types']:
-            print(f'  - {type_}: {info[code]["types"][type_]}')
+        for label, count_ in ((label, value) for stat, label, value in code_rows if stat == 'duration'):
+            print(f'  - {label}: {count_}')
         print('')
\ No newline at end of file
@@ -0,0 +1,126 @@
+import sys
+import json
+import time
+import hashlib
+
+from pathlib import Path
+from cacheGV import file_digest, pattern_digest
+from histGV import MODULES, find_calls
+from utilsGV import process_files, atomic_file
+
+
+WATCH_MANIFEST_FILE = '.interigv_watch.json'
+
+
+def candidate_digest(candidate: dict[str, str | list]) -> str:
+    # changes if anything in candidate info changes
+
+    return hashlib.sha256(json.dumps(candidate, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+
+def load_watch_manifest(pdf_dir: Path) -> dict[str, dict]:
+
+    manifest_file = pdf_dir / WATCH_MANIFEST_FILE
+    if not manifest_file.exists():
+        return {'files': {}, 'outputs': {}}
+
+    with open(manifest_file, encoding='utf-8') as f:
+        return json.load(f)
+
+def store_watch_manifest(pdf_dir: Path, manifest: dict[str, dict]) -> None:
+
+    manifest_file = pdf_dir / WATCH_MANIFEST_FILE
+    with atomic_file(manifest_file) as tmp_file:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=1, ensure_ascii=False)
+
+def output_entry(module, call: dict[str, Path]) -> dict[str, str]:
+    # everything a summary depends on: pdfs, patterns and columns, and candidate info
+
+    columns = module.DEFAULT_COLUMNS + module.EXTRA_COLUMNS
+    return {
+        'offert': file_digest(call['offert']),
+        'result': file_digest(call['result']) if call['result'] else None,
+        'offert_pattern': pattern_digest(module.OFFERT_PATTERN, module.OFFERT_CHECK_LINE, columns),
+        'result_pattern': pattern_digest(module.RESULT_PATTERN, module.RESULT_CHECK_LINE, columns),
+        'candidate': candidate_digest(module.CANDIDATE),
+    }
+
+def update_summaries(pdf_dir: Path, option: str) -> int:
+    """
+    PURPOSE:
+
+        Write summary of every call of option in directory whose pdfs, patterns or candidate info changed since
+        last run, other summaries are left untouched. Pdfs are paired as in histGV.py and only new or changed pdfs
+        are extracted and parsed again (see pdf cache), so a change in candidate info only filters records again
+
+    MANDATORY ARGUMENTS:
+
+        pdf_dir: directory with pdfs
+        option: dificil or continua
+    """
+    module = MODULES[option]
+    manifest = load_watch_manifest(pdf_dir)
+    calls = find_calls(pdf_dir, manifest['files'])
+    store_watch_manifest(pdf_dir, manifest)
+
+    updated, current = 0, 0
+    for key, call in calls.items():
+        if not key.startswith(f'{option}/') or call['offert'] is None:
+            continue
+
+        csv_file = call['offert'].with_suffix('.csv')
+        entry = output_entry(module, call)
+        if manifest['outputs'].get(str(csv_file)) == entry and csv_file.exists():
+            current += 1
+            continue
+
+        try:
+            process_files(call['offert'], call['result'], option, module.CANDIDATE, module.OFFERT_PATTERN,
+                          module.RESULT_PATTERN, module.OFFERT_CHECK_LINE, module.RESULT_CHECK_LINE,
+                          module.DEFAULT_COLUMNS, module.EXTRA_COLUMNS)
+        except (RuntimeError, ValueError) as error:
+            print(f' Warning: summary of {key} not updated, {error}')
+            continue
+
+        # manifest is updated after every summary, so an interrupted run is resumed
+        manifest['outputs'][str(csv_file)] = entry
+        store_watch_manifest(pdf_dir, manifest)
+        updated += 1
+
+    print(f'{updated} summaries updated, {current} up to date')
+    return updated
+
+def print_help():
+
+    print('')
+    print('Usage:')
+    print('=====')
+    print('')
+    print(' python watchGV.py dificil|continua /path/to/pdfs [--interval seconds]')
+    print('')
+    print(' - dificil|continua: option of pdfs, candidate info is taken from dificilGV.py or continuaGV.py')
+    print(' - pdfs: directory with offerts and results pdfs, paired as in histGV.py')
+    print(' - --interval: keep watching directory and update summaries every given seconds, run once if not given')
+    print('')
+    print(' Summaries are written next to offerts pdfs, only if pdfs, patterns or candidate info changed since last run')
+    print(f' (kept in \'{WATCH_MANIFEST_FILE}\' in pdfs directory)')
+    print('')
+
+if __name__ == '__main__':
+
+    args = sys.argv[1:]
+    interval = None
+    if '--interval' in args:
+        idx = args.index('--interval')
+        interval = float(args[idx+1]) if idx + 1 < len(args) and args[idx+1].replace('.', '', 1).isdigit() else 0
+        args = args[:idx] + args[idx+2:]
+
+    if len(args) != 2 or args[0] not in MODULES or interval == 0:
+        print_help()
+        raise RuntimeError('Arguments are missing or incorrect')
+
+    while True:
+        update_summaries(Path(args[1]), args[0])
+        if interval is None:
+            break
+        time.sleep(interval)